@@ -0,0 +1 @@
+"""Benchmarks for Coffee Finder, run against local fake services."""
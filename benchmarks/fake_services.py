@@ -0,0 +1,215 @@
+"""Local stand-in for Overpass, Google Places, Nominatim and ipinfo.
+
+FakeServices runs a ThreadingHTTPServer on 127.0.0.1 that answers the
+requests Coffee Finder makes with synthetic (or recorded) responses,
+after a configurable latency and with a configurable error rate, so the
+benchmarks never touch the real services.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+SERVICES = ("overpass", "google_places", "nominatim", "ipinfo")
+
+_PATHS = {
+    "/api/interpreter": "overpass",
+    "/maps/api/place/nearbysearch/json": "google_places",
+    "/search": "nominatim",
+    "/json": "ipinfo",
+}
+
+_BBOX = re.compile(r"\[bbox:([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\]")
+
+# Google pages hold at most 20 results and there are at most 3 pages
+_GOOGLE_PAGE = 20
+_GOOGLE_PAGES = 3
+
+
+def _rng(*parts) -> random.Random:
+    # same request, same answer: cached and uncached runs see the same data
+    digest = hashlib.sha1(repr(parts).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+class FakeServices:
+    """The fake upstream services, started with start() or as a context manager.
+
+    `latency` and `jitter` are seconds added to every answer, and with
+    probability `slow_rate` an answer takes `slow_latency` instead (a
+    latency tail, e.g. for a slow Overpass mirror); `places` is
+    how many cafes an Overpass bbox or a Google search returns and
+    `padding` adds that many bytes of tags per Overpass element. A request
+    fails with `error_status` with probability `error_rate`, or with the
+    per-service rate in `errors`. `responses` maps a service to a recorded
+    body that is served instead of a synthetic one.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, places: int = 40, padding: int = 0,
+                 error_rate: float = 0.0, errors: Optional[Dict[str, float]] = None, error_status: int = 503,
+                 responses: Optional[Dict[str, bytes]] = None, seed: int = 0,
+                 slow_rate: float = 0.0, slow_latency: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.places = places
+        self.padding = padding
+        self.error_rate = error_rate
+        self.errors = dict(errors or {})
+        self.error_status = error_status
+        self.responses = dict(responses or {})
+        self.stats = {s: {"requests": 0, "errors": 0, "bytes": 0} for s in SERVICES}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config(self) -> Dict:
+        """Coffee Finder config entries that point every service here."""
+        return {
+            "overpass_endpoints": [f"{self.url}/api/interpreter"],
+            "google_places_url": f"{self.url}/maps/api/place/nearbysearch/json",
+            "nominatim_url": f"{self.url}/search",
+            "ipinfo_url": f"{self.url}/json",
+        }
+
+    def start(self) -> "FakeServices":
+        services = self
+
+        class Handler(_Handler):
+            fake = services
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeServices":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _delay(self) -> float:
+        with self._lock:
+            if self.slow_rate > 0 and self._random.random() < self.slow_rate:
+                return self.slow_latency
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _fails(self, service: str) -> bool:
+        rate = self.errors.get(service, self.error_rate)
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    def _count(self, service: str, size: int, failed: bool) -> None:
+        with self._lock:
+            self.stats[service]["requests"] += 1
+            self.stats[service]["bytes"] += size
+            if failed:
+                self.stats[service]["errors"] += 1
+
+    def answer(self, service: str, query: Dict[str, str]) -> object:
+        """Return the synthetic response body for a request."""
+        if service == "overpass":
+            return self._overpass(query.get("data", ""))
+        if service == "google_places":
+            return self._google(query)
+        if service == "nominatim":
+            rng = _rng("nominatim", query.get("q", ""))
+            return [{"lat": str(rng.uniform(-60, 60)), "lon": str(rng.uniform(-180, 180))}]
+        return {"loc": "40.7128,-74.0060"}
+
+    def _overpass(self, data: str) -> Dict:
+        m = _BBOX.search(data)
+        south, west, north, east = (float(v) for v in m.groups()) if m else (0.0, 0.0, 0.01, 0.01)
+        rng = _rng("overpass", south, west, north, east)
+        elements = []
+        for i in range(self.places):
+            tags = {"amenity": "cafe", "name": f"Cafe {i}", "addr:street": "Fake Street",
+                    "addr:housenumber": str(i)}
+            if self.padding:
+                tags["description"] = "x" * self.padding
+            elements.append({"type": "node", "id": i, "lat": rng.uniform(south, north),
+                             "lon": rng.uniform(west, east), "tags": tags})
+        return {"version": 0.6, "generator": "fake-services", "elements": elements}
+
+    def _google(self, query: Dict[str, str]) -> Dict:
+        if "pagetoken" in query:
+            lat, lng, radius, page = query["pagetoken"].split(",")
+            lat, lng, radius, page = float(lat), float(lng), float(radius), int(page)
+        else:
+            lat, lng = (float(v) for v in query.get("location", "0,0").split(","))
+            radius, page = float(query.get("radius", 1000)), 0
+        rng = _rng("google", lat, lng, radius, page)
+        total = min(self.places, _GOOGLE_PAGE * _GOOGLE_PAGES)
+        count = max(0, min(_GOOGLE_PAGE, total - page * _GOOGLE_PAGE))
+        spread = radius / 111320.0
+        results = [{
+            "name": f"Google Cafe {page * _GOOGLE_PAGE + i}",
+            "geometry": {"location": {"lat": lat + rng.uniform(-spread, spread) * 0.7,
+                                      "lng": lng + rng.uniform(-spread, spread) * 0.7}},
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "vicinity": "Fake Street",
+        } for i in range(count)]
+        body = {"results": results, "status": "OK"}
+        if (page + 1) * _GOOGLE_PAGE < total:
+            body["next_page_token"] = f"{lat},{lng},{radius},{page + 1}"
+        return body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakeServices = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._serve(parse_qs(urlsplit(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._serve(parse_qs(self.rfile.read(length).decode()))
+
+    def _serve(self, params):
+        service = _PATHS.get(urlsplit(self.path).path)
+        if service is None:
+            self._send(404, b"not found")
+            return
+        query = {k: v[0] for k, v in params.items()}
+        time.sleep(self.fake._delay())
+        if self.fake._fails(service):
+            self.fake._count(service, 0, True)
+            self._send(self.fake.error_status, b"fake error", {"Retry-After": "0"})
+            return
+        body = self.fake.responses.get(service)
+        if body is None:
+            body = json.dumps(self.fake.answer(service, query)).encode()
+        self.fake._count(service, len(body), False)
+        self._send(200, body, {"Content-Type": "application/json"})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,307 @@
+"""Run Coffee Finder benchmarks against the local fake services.
+
+    python -m benchmarks.run [--scenarios cold,warm] [--iterations 50] [--output results.json]
+
+Each scenario gets its own fake server and an isolated config, cache and
+data directory, and reports latency percentiles (ms) and throughput as
+JSON so results can be compared across releases.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from .fake_services import SERVICES, FakeServices
+
+# isolate every path the app derives at import time before importing it
+_HOME = tempfile.mkdtemp(prefix="coffee-finder-bench-")
+atexit.register(shutil.rmtree, _HOME, True)
+_ENV = {
+    "XDG_CONFIG_HOME": os.path.join(_HOME, "config"),
+    "XDG_CACHE_HOME": os.path.join(_HOME, "cache"),
+    "XDG_DATA_HOME": os.path.join(_HOME, "data"),
+    "LOCALAPPDATA": os.path.join(_HOME, "local"),
+}
+os.environ.update(_ENV)
+os.environ.pop("GOOGLE_PLACES_API_KEY", None)
+
+from coffee_finder import cache, config, net, providers, scheduler  # noqa: E402
+from coffee_finder.mirrors import MirrorPool  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# search centres are drawn within half a degree of here
+_CENTER = (40.7128, -74.0060)
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    """Summarize latencies in seconds as milliseconds."""
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "min": round(ordered[0] * 1000, 3),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def _points(n: int, seed: int) -> List[tuple]:
+    rng = random.Random(seed)
+    return [(_CENTER[0] + rng.uniform(-0.5, 0.5), _CENTER[1] + rng.uniform(-0.5, 0.5)) for _ in range(n)]
+
+
+def _configure(services: FakeServices, api_key: Optional[str] = None, **overrides) -> None:
+    cfg = config._default_config()
+    cfg.update(services.config())
+    # the fake services have no rate limits to respect
+    cfg["http_rate_limits"] = {}
+    cfg["google_places_api_key"] = api_key
+    cfg.update(overrides)
+    config.write_config(cfg)
+    scheduler.reset_scheduler()
+    net.reset_session()
+
+
+def _fresh_cache(name: str) -> None:
+    cache._DB_PATH = os.path.join(_HOME, f"cache-{name}-{time.monotonic_ns()}.db")
+
+
+def _timed(calls: List[Callable[[], object]]) -> Dict:
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for call in calls:
+        t = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    return {"n": len(calls), "errors": errors, "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(len(calls) / elapsed, 3) if elapsed else 0.0,
+            "latency_ms": percentiles(latencies)}
+
+
+def scenario_cold(services: FakeServices, args) -> Dict:
+    """search_overpass with an empty cache every time."""
+    _configure(services)
+
+    def call(lat, lng):
+        _fresh_cache("cold")
+        return providers.search_overpass(lat, lng, radius=args.radius, limit=args.limit)
+
+    return _timed([lambda p=p: call(*p) for p in _points(args.iterations, args.seed)])
+
+
+def scenario_warm(services: FakeServices, args) -> Dict:
+    """search_overpass around points already in the on-disk cache (memory layer cleared)."""
+    _configure(services)
+    _fresh_cache("warm")
+    points = _points(args.iterations, args.seed)
+    for lat, lng in points:
+        providers.search_overpass(lat, lng, radius=args.radius, limit=args.limit)
+
+    def call(lat, lng):
+        cache._memory.clear()
+        return providers.search_overpass(lat, lng, radius=args.radius, limit=args.limit)
+
+    return _timed([lambda p=p: call(*p) for p in points])
+
+
+def scenario_warm_memory(services: FakeServices, args) -> Dict:
+    """Repeated search_overpass of one point, answered from the in-process cache."""
+    _configure(services)
+    _fresh_cache("memory")
+    lat, lng = _CENTER
+    providers.search_overpass(lat, lng, radius=args.radius, limit=args.limit)
+    return _timed([lambda: providers.search_overpass(lat, lng, radius=args.radius, limit=args.limit)] * args.iterations)
+
+
+def scenario_google(services: FakeServices, args) -> Dict:
+    """choose_provider with a Google key (paged Nearby Search)."""
+    _configure(services, api_key="bench-key")
+    _fresh_cache("google")
+    return _timed([lambda p=p: providers.choose_provider(p[0], p[1], radius=args.radius, limit=args.limit)
+                   for p in _points(args.iterations, args.seed)])
+
+
+def scenario_fallback(services: FakeServices, args) -> Dict:
+    """choose_provider when Google fails and Overpass answers."""
+    services.errors["google_places"] = 1.0
+    services.error_status = 500
+    _configure(services, api_key="bench-key")
+    _fresh_cache("fallback")
+    return _timed([lambda p=p: providers.choose_provider(p[0], p[1], radius=args.radius, limit=args.limit)
+                   for p in _points(args.iterations, args.seed)])
+
+
+def _mirrors(services: FakeServices, args, hedge: bool) -> Dict:
+    """Cold search_overpass with a slow-tailed mirror listed before `services`."""
+    slow = FakeServices(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, places=args.places,
+                        slow_rate=args.slow_rate, slow_latency=args.slow_ms / 1000, seed=args.seed + 1)
+    with slow:
+        endpoints = slow.config()["overpass_endpoints"] + services.config()["overpass_endpoints"]
+        _configure(services, overpass_endpoints=endpoints)
+        # open a connection to each mirror first so that no mirror is ranked
+        # down for its connection setup
+        for url in endpoints:
+            net.post(url, data={"data": "[bbox:0,0,0.01,0.01];"}).close()
+        if hedge:
+            providers._overpass_mirrors = MirrorPool(endpoints)
+        else:
+            # same ranking and failover on errors, but never a second request
+            # for a slow one
+            never = 24 * 3600.0
+            providers._overpass_mirrors = MirrorPool(endpoints, default_hedge_delay=never,
+                                                     min_hedge_delay=never, max_hedge_delay=never)
+
+        def call(lat, lng):
+            _fresh_cache("mirrors")
+            return providers.search_overpass(lat, lng, radius=args.radius, limit=args.limit)
+
+        result = _timed([lambda p=p: call(*p) for p in _points(args.iterations, args.seed)])
+        result["mirrors"] = providers.get_overpass_mirrors().snapshot()
+        result["slow_mirror_upstream"] = slow.stats
+    providers._overpass_mirrors = None
+    return result
+
+
+def scenario_mirrors_hedged(services: FakeServices, args) -> Dict:
+    """Two Overpass mirrors, the first with a slow tail; hedging on."""
+    return _mirrors(services, args, hedge=True)
+
+
+def scenario_mirrors_unhedged(services: FakeServices, args) -> Dict:
+    """The same two mirrors with hedging off (compare p99 with mirrors_hedged)."""
+    return _mirrors(services, args, hedge=False)
+
+
+def _cli(name: str, argv: List[str], stdin: Optional[str] = None) -> subprocess.CompletedProcess:
+    # each CLI scenario starts from its own empty cache
+    env = dict(os.environ, **_ENV)
+    env["XDG_CACHE_HOME"] = os.path.join(_HOME, f"cli-cache-{name}")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return subprocess.run([sys.executable, "-m", "coffee_finder"] + argv, input=stdin, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def scenario_cli_single(services: FakeServices, args) -> Dict:
+    """One `coffee-finder --latlng` process per search (includes startup)."""
+    _configure(services)
+    runs = max(1, args.iterations // 5)
+    return _timed([lambda p=p: _cli("single", ["--latlng", f"{p[0]},{p[1]}", "--radius", str(args.radius)])
+                   for p in _points(runs, args.seed)])
+
+
+def scenario_cli_batch(services: FakeServices, args) -> Dict:
+    """One `coffee-finder --batch -` process for all searches."""
+    _configure(services)
+    lines = "".join(f"{lat},{lng}\n" for lat, lng in _points(args.iterations, args.seed))
+    started = time.perf_counter()
+    done = _cli("batch", ["--batch", "-", "--workers", str(args.workers), "--radius", str(args.radius)], stdin=lines)
+    elapsed = time.perf_counter() - started
+    records = [json.loads(line) for line in done.stdout.splitlines()]
+    search = [r["timings_ms"]["search"] / 1000 for r in records if "search" in r.get("timings_ms", {})]
+    return {"n": len(records), "errors": sum(1 for r in records if "error" in r),
+            "elapsed_s": round(elapsed, 3), "throughput_per_s": round(len(records) / elapsed, 3),
+            "workers": args.workers, "latency_ms": percentiles(search)}
+
+
+SCENARIOS = {
+    "cold": scenario_cold,
+    "warm": scenario_warm,
+    "warm_memory": scenario_warm_memory,
+    "google": scenario_google,
+    "fallback": scenario_fallback,
+    "mirrors_hedged": scenario_mirrors_hedged,
+    "mirrors_unhedged": scenario_mirrors_unhedged,
+    "cli_single": scenario_cli_single,
+    "cli_batch": scenario_cli_batch,
+}
+
+
+def _load_replay(directory: Optional[str]) -> Dict[str, bytes]:
+    """Read recorded bodies named <service>.json (e.g. overpass.json)."""
+    if not directory:
+        return {}
+    responses = {}
+    for service in SERVICES:
+        path = os.path.join(directory, f"{service}.json")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                responses[service] = f.read()
+    return responses
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--iterations", type=int, default=50, help="Searches per scenario (default 50)")
+    parser.add_argument("--workers", type=int, default=4, help="Workers for cli_batch (default 4)")
+    parser.add_argument("--radius", type=int, default=1000, help="Search radius in meters (default 1000)")
+    parser.add_argument("--limit", type=int, default=10, help="Max results (default 10)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake service latency (default 50)")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Latency jitter, +/- (default 10)")
+    parser.add_argument("--places", type=int, default=40, help="Cafes per Overpass or Google answer (default 40)")
+    parser.add_argument("--padding", type=int, default=0, help="Extra bytes per Overpass element (default 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 503")
+    parser.add_argument("--slow-rate", type=float, default=0.03,
+                        help="Fraction of slow answers from the slow mirror in mirrors_* (default 0.03)")
+    parser.add_argument("--slow-ms", type=float, default=1000.0,
+                        help="Latency of the slow mirror's slow answers (default 1000)")
+    parser.add_argument("--replay", help="Directory with recorded <service>.json bodies to serve")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": vars(args),
+        },
+        "scenarios": {},
+    }
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+        services = FakeServices(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                                places=args.places, padding=args.padding, error_rate=args.error_rate,
+                                responses=_load_replay(args.replay), seed=args.seed)
+        with services:
+            result = SCENARIOS[name](services, args)
+        result["upstream"] = services.stats
+        report["scenarios"][name] = result
+        print(f"{name}: {result['latency_ms'].get('p50')} ms p50, {result['throughput_per_s']}/s",
+              file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Measure Coffee Finder startup cost with `python -X importtime`.
+
+    python -m benchmarks.startup [--module coffee_finder.main] [--runs 5] [--top 15]
+
+Imports each module in a fresh interpreter several times and reports, as
+JSON, the total import time (percentiles over the runs), the wall time of
+`coffee-finder --help`, and the slowest imports by cumulative time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ("coffee_finder.main", "coffee_finder.providers", "coffee_finder.database", "coffee_finder.tray")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Parse -X importtime output into {module, depth, self_us, cumulative_us}."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(fields[0]),
+            "cumulative_us": int(fields[1]),
+        })
+    return rows
+
+
+def import_profile(module: str) -> List[Dict]:
+    done = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          env=_env(), capture_output=True, text=True, check=True)
+    return parse_importtime(done.stderr)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "min": ordered[0],
+        "p50": ordered[len(ordered) // 2],
+        "max": ordered[-1],
+    }
+
+
+def measure_module(module: str, runs: int, top: int) -> Dict:
+    totals, profiles = [], []
+    for _ in range(runs):
+        rows = import_profile(module)
+        profiles.append(rows)
+        # top-level imports triggered by this module (site and friends excluded)
+        totals.append(sum(r["cumulative_us"] for r in rows if r["depth"] == 0 and r["module"] != "site"))
+    # the slowest imports of the median run
+    median = profiles[sorted(range(runs), key=totals.__getitem__)[runs // 2]]
+    slowest = sorted(median, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+    return {
+        "import_ms": {k: round(v / 1000, 3) for k, v in _percentiles(totals).items()},
+        "slowest": [{"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 3),
+                     "self_ms": round(r["self_us"] / 1000, 3)} for r in slowest],
+    }
+
+
+def measure_cli(runs: int) -> Dict[str, float]:
+    """Wall time of a whole `coffee-finder --help` process."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "coffee_finder", "--help"], env=_env(),
+                       capture_output=True, check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return {k: round(v, 3) for k, v in _percentiles(times).items()}
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--module", action="append", help="Module to import (repeatable; default: the entry points)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (default 5)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list (default 15)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "modules": {}}
+    for module in args.module or DEFAULT_MODULES:
+        try:
+            report["modules"][module] = measure_module(module, args.runs, args.top)
+        except subprocess.CalledProcessError as e:
+            # e.g. the tray needs a display and pystray
+            report["modules"][module] = {"error": e.stderr.strip().splitlines()[-1] if e.stderr else str(e)}
+    report["cli_help_ms"] = measure_cli(args.runs)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,12 @@ Handles user registration, login, and password hashing.
 import sqlite3
 import hashlib
 import os
+import threading
 from typing import Tuple, Optional
 from datetime import datetime
 
+from .migrations import migrate
+
 def _get_auth_db():
     """Get database connection for authentication."""
     from .database import _db_path
@@ -18,32 +21,45 @@ def _get_auth_db():
 
 _AUTH_DB = _get_auth_db()
 
-def _get_conn():
-    """Get database connection."""
+# Schema is created on first use, not on import
+_ready_path: Optional[str] = None
+_init_lock = threading.Lock()
+
+def _connect():
     conn = sqlite3.connect(_AUTH_DB)
     conn.row_factory = sqlite3.Row
     return conn
 
+def _get_conn():
+    """Get database connection, initializing the schema on first use."""
+    if _ready_path != _AUTH_DB:
+        _init_auth_db()
+    return _connect()
+
 def _init_auth_db():
     """Initialize authentication database schema."""
-    conn = _get_conn()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+    global _ready_path
+    with _init_lock:
+        os.makedirs(os.path.dirname(_AUTH_DB) or ".", exist_ok=True)
+        conn = _connect()
+        try:
+            migrate(conn, _MIGRATIONS)
+        finally:
+            conn.close()
+        _ready_path = _AUTH_DB
 
-# Initialize on import
-_init_auth_db()
+# Append-only; see migrations.py
+_MIGRATIONS = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+)
 
 def _hash_password(password: str) -> str:
     """Hash password using SHA-256."""
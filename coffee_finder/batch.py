@@ -0,0 +1,120 @@
+"""Batch searches: many locations in, one JSON line per location out.
+
+All searches in a batch share one process, so the HTTP session, the
+cache connections and the in-memory cache stay warm across queries.
+"""
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List, Optional, TextIO
+
+from .cache import stale_reads
+from .geocode import geocode
+from .providers import choose_provider, filter_by_rating
+from .utils import parse_latlng
+
+STAGES = ("geocode", "search")
+
+
+def _parse_location(text: str):
+    """Return (lat, lng) for "lat,lng" input, or None for an address."""
+    try:
+        return parse_latlng(text)
+    except ValueError:
+        return None
+
+
+def _run_one(index: int, text: str, radius: int, limit: int, min_rating: Optional[float]) -> Dict:
+    record = {"line": index, "input": text}
+    timings = {}
+    try:
+        started = time.perf_counter()
+        loc = _parse_location(text)
+        if loc is None:
+            loc = geocode(text)
+        timings["geocode"] = time.perf_counter() - started
+        lat, lng = loc
+        record["lat"], record["lng"] = lat, lng
+
+        started = time.perf_counter()
+        stale_before = stale_reads()
+        places = choose_provider(lat, lng, radius=radius, limit=limit, min_rating=min_rating)
+        timings["search"] = time.perf_counter() - started
+        record["places"] = filter_by_rating(places, min_rating)
+        # served from expired cache entries that are being refreshed
+        record["stale"] = stale_reads() > stale_before
+    except Exception as e:
+        record["error"] = str(e)
+    record["timings_ms"] = {k: round(v * 1000, 3) for k, v in timings.items()}
+    return record
+
+
+def _read_inputs(lines: Iterable[str]):
+    for n, line in enumerate(lines, start=1):
+        text = line.strip()
+        if text and not text.startswith("#"):
+            yield n, text
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_batch(lines: Iterable[str], out: TextIO, radius: int = 1000, limit: int = 10,
+              min_rating: Optional[float] = None, workers: int = 4, order: str = "input") -> Dict:
+    """Search every input line on a bounded thread pool and write JSON lines.
+
+    `order` is "input" (output follows input order) or "completion"
+    (each line is written as soon as it is done). Returns a summary with
+    counts, throughput and per-stage latency percentiles.
+    """
+    started = time.perf_counter()
+    stage_times: Dict[str, List[float]] = {s: [] for s in STAGES}
+    summary = {"inputs": 0, "ok": 0, "errors": 0}
+    # bound the number of queued inputs so huge files stream through
+    max_inflight = max(1, workers) * 2
+
+    def emit(record: Dict) -> None:
+        summary["inputs"] += 1
+        summary["errors" if "error" in record else "ok"] += 1
+        for stage, ms in record["timings_ms"].items():
+            stage_times[stage].append(ms)
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        inflight = deque()
+        for n, text in _read_inputs(lines):
+            inflight.append(pool.submit(_run_one, n, text, radius, limit, min_rating))
+            while len(inflight) >= max_inflight:
+                if order == "completion":
+                    done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        inflight.remove(f)
+                        emit(f.result())
+                else:
+                    emit(inflight.popleft().result())
+        if order == "completion":
+            while inflight:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for f in done:
+                    inflight.remove(f)
+                    emit(f.result())
+        else:
+            while inflight:
+                emit(inflight.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["throughput_per_s"] = round(summary["inputs"] / elapsed, 3) if elapsed > 0 else 0.0
+    summary["stages_ms"] = {
+        stage: {
+            "mean": round(sum(v) / len(v), 3),
+            "p50": _percentile(v, 0.5),
+            "p95": _percentile(v, 0.95),
+        }
+        for stage, v in stage_times.items() if v
+    }
+    return summary
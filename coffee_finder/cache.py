@@ -1,9 +1,16 @@
 """Simple on-disk sqlite cache for query results."""
 import os
 import sqlite3
-import json
+import threading
 import time
-from typing import Any, Optional
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .codec import decode, encode
+from .migrations import has_column, migrate
+from .trace import span
+from .utils import haversine_distance
 
 
 def _cache_path() -> str:
@@ -11,41 +18,550 @@ def _cache_path() -> str:
         base = os.getenv("LOCALAPPDATA") or os.path.expanduser("~")
     else:
         base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
-    d = os.path.join(base, "coffee_finder")
-    os.makedirs(d, exist_ok=True)
-    return os.path.join(d, "cache.db")
+    return os.path.join(base, "coffee_finder", "cache.db")
 
 
 _DB_PATH = _cache_path()
 
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the prepared statement on every call.
+_SQL_GET = "SELECT v, ts, atime FROM cache WHERE k=?"
+_SQL_TOUCH = "UPDATE cache SET atime=? WHERE k=?"
+_SQL_SET = "REPLACE INTO cache (k, v, ts, size, atime, expires) VALUES (?, ?, ?, ?, ?, ?)"
+_SQL_SET_AREA = "REPLACE INTO cache_areas (k, ns, lat, lng, radius, ts) VALUES (?, ?, ?, ?, ?, ?)"
+# latitude difference alone is a lower bound on distance, so this prefilter
+# never drops a containing disk; meters per degree must not exceed the one
+# haversine_distance uses (R * pi / 180 = 111194.93 m), hence rounded down
+_SQL_GET_AREAS = """SELECT a.lat, a.lng, a.radius, c.v, a.ts FROM cache_areas a JOIN cache c ON c.k = a.k
+    WHERE a.ns = ? AND a.ts >= ? AND a.radius >= ? AND ABS(a.lat - ?) * 111194.0 <= a.radius - ?
+    ORDER BY a.radius"""
+_SQL_DELETE_EXPIRED = "DELETE FROM cache WHERE expires < ?"
+_SQL_DELETE_ORPHAN_AREAS = "DELETE FROM cache_areas WHERE k NOT IN (SELECT k FROM cache)"
+_SQL_TOTALS = "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+_SQL_LRU = "SELECT k, size FROM cache ORDER BY atime LIMIT ?"
+_SQL_DELETE = "DELETE FROM cache WHERE k=?"
+
+# access times are only written back when older than this, so reads
+# don't turn into a write each time
+_ATIME_RESOLUTION = 60
+# run an amortized sweep after this many writes
+_SWEEP_EVERY = 500
+# pages released per sweep by incremental vacuum
+_VACUUM_PAGES = 256
+
+# operations slower than this are counted as having waited on a lock
+_SLOW_OP_SECONDS = 0.05
+
+
+def _add_eviction_columns(conn: sqlite3.Connection) -> None:
+    # caches from before size-bounded eviction
+    if not has_column(conn, "cache", "expires"):
+        conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER DEFAULT 0")
+        conn.execute("ALTER TABLE cache ADD COLUMN atime INTEGER DEFAULT 0")
+        conn.execute("ALTER TABLE cache ADD COLUMN expires INTEGER")
+        conn.execute("UPDATE cache SET size = LENGTH(v), atime = ts, expires = ts + 86400")
+
 
-def _get_conn():
-    conn = sqlite3.connect(_DB_PATH, check_same_thread=False)
-    conn.execute("""CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v TEXT, ts INTEGER)""")
-    return conn
+# Append-only; see migrations.py. Files from before versioning are at
+# user_version 0 and may already have some of these.
+_MIGRATIONS = (
+    "CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v BLOB, ts INTEGER, "
+    "size INTEGER DEFAULT 0, atime INTEGER DEFAULT 0, expires INTEGER)",
+    "CREATE TABLE IF NOT EXISTS cache_areas (k TEXT PRIMARY KEY, ns TEXT, lat REAL, lng REAL, radius REAL, ts INTEGER)",
+    _add_eviction_columns,
+    "CREATE INDEX IF NOT EXISTS cache_ts ON cache (ts)",
+    "CREATE INDEX IF NOT EXISTS cache_atime ON cache (atime)",
+    "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)",
+)
 
 
-def cache_get(key: str, max_age_seconds: int = 24 * 3600) -> Optional[Any]:
+class _ThreadConn:
+    """Holds a thread's connection; the connection is closed once the
+    thread ends and its thread-local data (this object) is released."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        weakref.finalize(self, _close_quietly, conn)
+
+
+def _close_quietly(conn: sqlite3.Connection) -> None:
     try:
-        conn = _get_conn()
-        cur = conn.execute("SELECT v, ts FROM cache WHERE k=?", (key,))
-        row = cur.fetchone()
         conn.close()
-        if not row:
+    except Exception:
+        pass
+
+
+class CacheBackend:
+    """SQLite cache store with one long-lived WAL connection per thread.
+
+    Connections of threads that have finished are closed, so processes
+    starting a thread per search don't accumulate open files. Errors are
+    counted rather than raised; "database is locked" failures (after
+    waiting out busy_timeout) are tracked separately in `stats`.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.stats = {"reads": 0, "writes": 0, "slow": 0, "locked": 0, "errors": 0,
+                      "expired": 0, "evicted": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # weak, so a thread's connection goes away with the thread
+        self._holders: "weakref.WeakSet[_ThreadConn]" = weakref.WeakSet()
+        self._schema_ready = False
+        self._writes_since_sweep = 0
+        self._vacuum_checked = False
+
+    def _conn(self) -> sqlite3.Connection:
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            return holder.conn
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0,
+                               check_same_thread=False, cached_statements=64)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        # must come before anything that initializes a new file (switching
+        # to WAL does); older files are converted by the background sweeper
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            if not self._schema_ready:
+                self._create_schema(conn)
+                self._schema_ready = True
+            holder = _ThreadConn(conn)
+            self._holders.add(holder)
+        self._local.holder = holder
+        return conn
+
+    def open_connections(self) -> int:
+        """Return how many per-thread connections are currently open."""
+        with self._lock:
+            return len(self._holders)
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        migrate(conn, _MIGRATIONS)
+
+    def _count(self, name: str, started: float) -> None:
+        with self._lock:
+            self.stats[name] += 1
+            if time.perf_counter() - started > _SLOW_OP_SECONDS:
+                self.stats["slow"] += 1
+
+    def _failed(self, exc: Exception) -> None:
+        msg = str(exc).lower()
+        with self._lock:
+            if isinstance(exc, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg):
+                self.stats["locked"] += 1
+            else:
+                self.stats["errors"] += 1
+
+    def get(self, key: str) -> Optional[Tuple[Union[bytes, str], int]]:
+        started = time.perf_counter()
+        try:
+            conn = self._conn()
+            row = conn.execute(_SQL_GET, (key,)).fetchone()
+            if row is not None:
+                now = int(time.time())
+                if now - (row[2] or 0) > _ATIME_RESOLUTION:
+                    with conn:
+                        conn.execute(_SQL_TOUCH, (now, key))
+        except Exception as e:
+            self._failed(e)
             return None
-        val, ts = row
-        if int(time.time()) - int(ts) > max_age_seconds:
+        self._count("reads", started)
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, value: bytes, ts: int, ttl: int) -> bool:
+        started = time.perf_counter()
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute(_SQL_SET, (key, value, ts, len(value), ts, ts + ttl))
+        except Exception as e:
+            self._failed(e)
+            return False
+        self._count("writes", started)
+        self._wrote()
+        return True
+
+    def set_area(self, key: str, ns: str, lat: float, lng: float, radius: float,
+                 value: bytes, ts: int, ttl: int) -> bool:
+        started = time.perf_counter()
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute(_SQL_SET, (key, value, ts, len(value), ts, ts + ttl))
+                conn.execute(_SQL_SET_AREA, (key, ns, lat, lng, radius, ts))
+        except Exception as e:
+            self._failed(e)
+            return False
+        self._count("writes", started)
+        self._wrote()
+        return True
+
+    def _wrote(self) -> None:
+        with self._lock:
+            self._writes_since_sweep += 1
+            due = self._writes_since_sweep >= _SWEEP_EVERY
+            if due:
+                self._writes_since_sweep = 0
+        if due:
+            self.sweep(*_limits())
+
+    def sweep(self, max_rows: int, max_bytes: int, convert: bool = False) -> Dict[str, int]:
+        """Delete expired rows, evict least recently used rows over budget
+        and release free pages back to the filesystem.
+
+        With `convert`, a file created without incremental auto_vacuum is
+        first rebuilt with a full VACUUM, which can take a while on a large
+        cache; only the background sweeper asks for that.
+        """
+        result = {"expired": 0, "evicted": 0}
+        try:
+            conn = self._conn()
+            if convert and not self._vacuum_checked:
+                self._vacuum_checked = True
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    # one-off conversion of a cache created before auto_vacuum
+                    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    conn.execute("VACUUM")
+            with conn:
+                result["expired"] = conn.execute(_SQL_DELETE_EXPIRED, (int(time.time()),)).rowcount
+                rows, total = conn.execute(_SQL_TOTALS).fetchone()
+                # evict down to 90% of the budget so we don't sweep on every write
+                excess_rows = rows - int(max_rows * 0.9) if rows > max_rows else 0
+                excess_bytes = total - int(max_bytes * 0.9) if total > max_bytes else 0
+                if excess_rows > 0 or excess_bytes > 0:
+                    victims = []
+                    for k, size in conn.execute(_SQL_LRU, (rows,)):
+                        if excess_rows <= 0 and excess_bytes <= 0:
+                            break
+                        victims.append((k,))
+                        excess_rows -= 1
+                        excess_bytes -= size or 0
+                    conn.executemany(_SQL_DELETE, victims)
+                    result["evicted"] = len(victims)
+                conn.execute(_SQL_DELETE_ORPHAN_AREAS)
+            conn.execute(f"PRAGMA incremental_vacuum({_VACUUM_PAGES})").fetchall()
+        except Exception as e:
+            self._failed(e)
+            return result
+        with self._lock:
+            self.stats["expired"] += result["expired"]
+            self.stats["evicted"] += result["evicted"]
+        return result
+
+    def get_areas(self, ns: str, lat: float, radius: float, min_ts: int) -> List[tuple]:
+        started = time.perf_counter()
+        try:
+            rows = self._conn().execute(_SQL_GET_AREAS, (ns, min_ts, radius, lat, radius)).fetchall()
+        except Exception as e:
+            self._failed(e)
+            return []
+        self._count("reads", started)
+        return rows
+
+    def close(self) -> None:
+        with self._lock:
+            holders = list(self._holders)
+            self._holders = weakref.WeakSet()
+        for holder in holders:
+            _close_quietly(holder.conn)
+        self._local = threading.local()
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU of decoded values, bounded by entry count
+    and approximate size (see _memory_size).
+
+    Values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0}
+        self._data: "OrderedDict[str, Tuple[Any, int, int, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, max_age_seconds: int) -> Optional[Any]:
+        entry = self.get_entry(key, max_age_seconds)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: str, max_age_seconds: int) -> Optional[Tuple[Any, int]]:
+        """Return (value, ts) if the entry is younger than `max_age_seconds`."""
+        now = int(time.time())
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, ts, size, expires = entry
+                if now > expires:
+                    self._drop(key)
+                elif now - ts <= max_age_seconds:
+                    self._data.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value, ts
+            self.stats["misses"] += 1
             return None
-        return json.loads(val)
-    except Exception:
-        return None
+
+    def put(self, key: str, value: Any, ts: int, size: int, ttl: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, ts, size, ts + ttl)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+
+    def _drop(self, key: str) -> None:
+        _, _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+_memory = MemoryCache()
+
+# rough memory held by one decoded place: the dict, its floats and strings
+_PLACE_BYTES = 480
+
+
+def _memory_size(value: Any) -> int:
+    """Approximate memory held by a decoded value, for MemoryCache's bound.
+
+    The encoded row is no guide: compressed place lists decode to well over
+    ten times their size.
+    """
+    if isinstance(value, list) and value and all(isinstance(p, dict) for p in value):
+        return len(value) * _PLACE_BYTES
+    return len(encode(value, compress=False))
+
+_backend: Optional[CacheBackend] = None
+_backend_lock = threading.Lock()
 
 
-def cache_set(key: str, value: Any) -> None:
+def _get_backend() -> CacheBackend:
+    """Return the shared backend, reopening it if `_DB_PATH` changed."""
+    global _backend
+    backend = _backend
+    if backend is not None and backend.path == _DB_PATH:
+        return backend
+    with _backend_lock:
+        if _backend is None or _backend.path != _DB_PATH:
+            if _backend is not None:
+                _backend.close()
+            _memory.clear()
+            _backend = CacheBackend(_DB_PATH)
+        return _backend
+
+
+def _limits() -> Tuple[int, int]:
+    from .config import get_cache_limits
+    return get_cache_limits()
+
+
+def _default_ttl() -> int:
+    from .config import get_cache_ttl
+    return get_cache_ttl()
+
+
+def _stale_grace() -> int:
+    from .config import get_cache_stale_grace
+    return get_cache_stale_grace()
+
+
+# Stale-while-revalidate: a value past its max age but within the caller's
+# `stale_seconds` grace is still returned, and the caller schedules one
+# background refresh with schedule_refresh(). Rows are kept on disk for
+# their TTL plus the configured grace so there is something to serve.
+_freshness = threading.local()
+
+
+def stale_reads() -> int:
+    """Return how many stale values have been served to this thread.
+
+    Compare the count before and after a search to tell whether its
+    results came (partly) from stale cache entries being refreshed.
+    """
+    return getattr(_freshness, "stale", 0)
+
+
+def _count_stale() -> None:
+    _freshness.stale = stale_reads() + 1
+
+
+_refreshing: Dict[str, threading.Thread] = {}
+_refresh_lock = threading.Lock()
+
+
+def schedule_refresh(key: str, refresh: Callable[[], Any]) -> bool:
+    """Run `refresh` on a background thread at background priority, unless
+    a refresh for `key` is already running. Returns True if one was started."""
+    from .scheduler import BACKGROUND, priority
+
+    def run():
+        try:
+            with priority(BACKGROUND):
+                refresh()
+        except Exception:
+            pass
+        finally:
+            with _refresh_lock:
+                _refreshing.pop(key, None)
+
+    with _refresh_lock:
+        if key in _refreshing:
+            return False
+        t = _refreshing[key] = threading.Thread(target=run, name="cache-refresh", daemon=True)
+    t.start()
+    return True
+
+
+def wait_for_refreshes(timeout: Optional[float] = None) -> bool:
+    """Wait for running background refreshes (e.g. before a CLI exits).
+
+    Returns False if some were still running after `timeout` seconds.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _refresh_lock:
+        threads = list(_refreshing.values())
+    for t in threads:
+        t.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    return not any(t.is_alive() for t in threads)
+
+
+def cache_stats() -> Dict[str, int]:
+    """Return a snapshot of cache operation and lock contention counters.
+
+    Keys prefixed with ``memory_`` are for the in-process layer.
+    """
+    stats = dict(_get_backend().stats)
+    stats.update({f"memory_{k}": v for k, v in _memory.stats.items()})
+    return stats
+
+
+def sweep(convert: bool = False) -> Dict[str, int]:
+    """Expire and evict cache rows now; returns the number of rows removed.
+
+    `convert` allows the one-off VACUUM of a cache file from before
+    incremental auto_vacuum (see CacheBackend.sweep).
+    """
+    return _get_backend().sweep(*_limits(), convert=convert)
+
+
+def start_sweeper(interval_seconds: int = 3600) -> None:
+    """Run sweep() periodically on a daemon thread (for long-lived processes)."""
+    from .scheduler import run_periodically
+    run_periodically("cache-sweeper", lambda: sweep(convert=True), interval_seconds)
+
+
+def cache_get(key: str, max_age_seconds: int = 24 * 3600, stale_seconds: int = 0) -> Optional[Any]:
+    """Return a cached value younger than `max_age_seconds`, or None.
+
+    A value up to `stale_seconds` past its max age is still returned and
+    counted in stale_reads(). Reads through the in-process layer; returned
+    values are shared and must not be mutated.
+    """
+    with span("cache.get"):
+        try:
+            limit = max_age_seconds + stale_seconds
+            entry = _memory.get_entry(key, limit)
+            if entry is not None:
+                value, ts = entry
+            else:
+                row = _get_backend().get(key)
+                if not row:
+                    return None
+                val, ts = row
+                ts = int(ts)
+                if int(time.time()) - ts > limit:
+                    return None
+                with span("cache.decode"):
+                    value = decode(val)
+                _memory.put(key, value, ts, _memory_size(value), limit)
+            if int(time.time()) - ts > max_age_seconds:
+                _count_stale()
+            return value
+        except Exception:
+            return None
+
+
+def cache_set(key: str, value: Any, ttl: Optional[int] = None) -> None:
+    """Store a value; the sweeper may delete it once `ttl` seconds (defaults
+    to the configured cache TTL) plus the stale grace period have passed."""
+    with span("cache.set"):
+        try:
+            ttl = _default_ttl() if ttl is None else ttl
+            now = int(time.time())
+            with span("cache.encode"):
+                encoded = encode(value)
+            _memory.put(key, value, now, _memory_size(value), ttl)
+            _get_backend().set(key, encoded, now, ttl + _stale_grace())
+        except Exception:
+            pass
+
+
+def _area_key(namespace: str, lat: float, lng: float, radius: float) -> str:
+    return f"{namespace}:area:{lat:.6f}:{lng:.6f}:{radius:g}"
+
+
+def cache_set_area(namespace: str, lat: float, lng: float, radius: float, value: Any,
+                   ttl: Optional[int] = None) -> None:
+    """Cache a value that is complete for the disk (lat, lng, radius)."""
+    key = _area_key(namespace, lat, lng, radius)
     try:
-        conn = _get_conn()
-        conn.execute("REPLACE INTO cache (k, v, ts) VALUES (?, ?, ?)", (key, json.dumps(value), int(time.time())))
-        conn.commit()
-        conn.close()
+        ttl = _default_ttl() if ttl is None else ttl
+        now = int(time.time())
+        encoded = encode(value)
+        _memory.put(key, value, now, _memory_size(value), ttl)
+        _get_backend().set_area(key, namespace, lat, lng, radius, encoded, now, ttl + _stale_grace())
     except Exception:
         pass
+
+
+def cache_get_area(namespace: str, lat: float, lng: float, radius: float,
+                   max_age_seconds: int = 24 * 3600, stale_seconds: int = 0) -> Optional[Any]:
+    """Return a fresh value cached for any disk that contains (lat, lng, radius).
+
+    The smallest containing disk wins; callers filter it down themselves.
+    `stale_seconds` allows stale values as in cache_get().
+    """
+    # repeated lookups of the same disk are answered in memory, but only
+    # while fresh: a stale answer is looked up again so that a disk written
+    # by the refresh since then is found
+    query_key = f"{namespace}:area?{lat:.6f}:{lng:.6f}:{radius:g}"
+    with span("cache.get_area"):
+        try:
+            entry = _memory.get_entry(query_key, max_age_seconds)
+            if entry is not None:
+                return entry[0]
+            now = int(time.time())
+            rows = _get_backend().get_areas(namespace, lat, radius, now - max_age_seconds - stale_seconds)
+            stale = None
+            for a_lat, a_lng, a_radius, val, ts in rows:
+                if haversine_distance(a_lat, a_lng, lat, lng) + radius > a_radius:
+                    continue
+                if now - int(ts) > max_age_seconds:
+                    # keep looking for a fresh containing disk
+                    stale = stale or val
+                    continue
+                value = decode(val)
+                _memory.put(query_key, value, int(ts), _memory_size(value), max_age_seconds)
+                return value
+            if stale is None:
+                return None
+            _count_stale()
+            return decode(stale)
+        except Exception:
+            return None
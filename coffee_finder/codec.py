@@ -0,0 +1,168 @@
+"""Binary encodings for cached values.
+
+Every encoded value starts with a one-byte codec id and a one-byte flags
+field, so codecs can be added or changed without invalidating old rows.
+Rows written before codecs existed are plain JSON text and still decode.
+"""
+import json
+import math
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Union
+
+_FLAG_ZLIB = 0x01
+# payloads smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 512
+
+PLACE_FIELDS = ("name", "lat", "lng", "address", "distance_m", "rating", "source")
+_STR_FIELDS = ("name", "address", "source")
+_NUM_FIELDS = ("lat", "lng", "distance_m", "rating")
+_NO_STRING = 0xFFFFFFFF
+_HEADER = struct.Struct("<II")
+
+
+class Codec:
+    """An encoding for some kind of value, identified by a unique byte."""
+
+    def __init__(self, codec_id: int, accepts: Callable[[Any], bool],
+                 encode: Callable[[Any], bytes], decode: Callable[[bytes], Any]):
+        self.codec_id = codec_id
+        self.accepts = accepts
+        self.encode = encode
+        self.decode = decode
+
+
+_codecs: List[Codec] = []
+_by_id: Dict[int, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Register a codec; later registrations are tried first when encoding."""
+    if codec.codec_id in _by_id:
+        raise ValueError(f"codec id {codec.codec_id} already registered")
+    _codecs.insert(0, codec)
+    _by_id[codec.codec_id] = codec
+
+
+def _le(arr: array) -> array:
+    # arrays are stored little-endian regardless of the host
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def _is_place_list(value: Any) -> bool:
+    if not isinstance(value, list) or not value:
+        return False
+    for p in value:
+        if not isinstance(p, dict) or len(p) != len(PLACE_FIELDS):
+            return False
+        for k in _STR_FIELDS:
+            if k not in p or not (p[k] is None or isinstance(p[k], str)):
+                return False
+        for k in _NUM_FIELDS:
+            v = p.get(k, "")
+            if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float))):
+                return False
+    return True
+
+
+def _encode_places(places: List[Dict]) -> bytes:
+    """Pack places column-wise: a string table plus fixed-width arrays."""
+    strings: List[str] = []
+    index: Dict[str, int] = {}
+    refs = {k: array("I") for k in _STR_FIELDS}
+    nums = {k: array("d") for k in _NUM_FIELDS}
+    for p in places:
+        for k in _STR_FIELDS:
+            v = p[k]
+            if v is None:
+                refs[k].append(_NO_STRING)
+                continue
+            i = index.get(v)
+            if i is None:
+                i = index[v] = len(strings)
+                strings.append(v)
+            refs[k].append(i)
+        for k in _NUM_FIELDS:
+            v = p[k]
+            nums[k].append(math.nan if v is None else float(v))
+    encoded = [s.encode("utf-8") for s in strings]
+    lengths = array("I", (len(b) for b in encoded))
+    parts = [_HEADER.pack(len(places), len(strings)), _le(lengths).tobytes(), b"".join(encoded)]
+    parts += [_le(refs[k]).tobytes() for k in _STR_FIELDS]
+    parts += [_le(nums[k]).tobytes() for k in _NUM_FIELDS]
+    return b"".join(parts)
+
+
+def _decode_places(data: bytes) -> List[Dict]:
+    n, nstrings = _HEADER.unpack_from(data)
+    pos = _HEADER.size
+
+    def take(typecode: str, count: int) -> array:
+        nonlocal pos
+        arr = array(typecode)
+        size = arr.itemsize * count
+        arr.frombytes(data[pos:pos + size])
+        pos += size
+        return _le(arr)
+
+    lengths = take("I", nstrings)
+    strings = []
+    for length in lengths:
+        strings.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+    refs = {k: take("I", n) for k in _STR_FIELDS}
+    nums = {k: take("d", n) for k in _NUM_FIELDS}
+    places = []
+    for i in range(n):
+        p = {}
+        for k in PLACE_FIELDS:
+            if k in refs:
+                r = refs[k][i]
+                p[k] = None if r == _NO_STRING else strings[r]
+            else:
+                v = nums[k][i]
+                p[k] = None if math.isnan(v) else v
+        places.append(p)
+    return places
+
+
+def _encode_json(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_json(data: bytes) -> Any:
+    return json.loads(data.decode("utf-8"))
+
+
+JSON_CODEC = Codec(1, lambda value: True, _encode_json, _decode_json)
+PLACES_CODEC = Codec(2, _is_place_list, _encode_places, _decode_places)
+register_codec(JSON_CODEC)
+register_codec(PLACES_CODEC)
+
+
+def encode(value: Any, compress: bool = True) -> bytes:
+    """Encode a value with the first codec that accepts it."""
+    codec = next(c for c in _codecs if c.accepts(value))
+    payload = codec.encode(value)
+    flags = 0
+    if compress and len(payload) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(payload, 6)
+        if len(packed) < len(payload):
+            payload = packed
+            flags |= _FLAG_ZLIB
+    return bytes((codec.codec_id, flags)) + payload
+
+
+def decode(blob: Union[bytes, str]) -> Optional[Any]:
+    """Decode a value written by encode() or a legacy JSON text row."""
+    if isinstance(blob, str):
+        return json.loads(blob)
+    codec = _by_id[blob[0]]
+    payload = bytes(blob[2:])
+    if blob[1] & _FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    return codec.decode(payload)
@@ -1,7 +1,16 @@
-"""Persistent configuration storage for Coffee Finder."""
+"""Persistent configuration storage for Coffee Finder.
+
+config.json is parsed once and kept in memory; the file is only stat()ed,
+at most every _CHECK_INTERVAL seconds, to pick up edits made by hand or by
+another process. Environment variables listed in _ENV_OVERRIDES take
+precedence over the file.
+"""
 import json
 import os
-from typing import Any, Dict
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def _config_path() -> str:
@@ -9,9 +18,7 @@ def _config_path() -> str:
         base = os.getenv("LOCALAPPDATA") or os.path.expanduser("~")
     else:
         base = os.getenv("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
-    d = os.path.join(base, "coffee_finder")
-    os.makedirs(d, exist_ok=True)
-    return os.path.join(d, "config.json")
+    return os.path.join(base, "coffee_finder", "config.json")
 
 
 _PATH = _config_path()
@@ -21,45 +28,225 @@ def _default_config() -> Dict[str, Any]:
     return {
         "cache_ttl_seconds": 24 * 3600,
         "google_places_api_key": None,
+        # expired results are still served (and refreshed in the background)
+        # for this long past the TTL
+        "cache_stale_grace_seconds": 7 * 24 * 3600,
+        "cache_max_rows": 50000,
+        "cache_max_bytes": 64 * 1024 * 1024,
+        "overpass_endpoints": [
+            "https://overpass-api.de/api/interpreter",
+            "https://overpass.kumi.systems/api/interpreter",
+            "https://overpass.private.coffee/api/interpreter",
+        ],
+        # upstream services; point these at a local stand-in for benchmarks
+        "google_places_url": "https://maps.googleapis.com/maps/api/place/nearbysearch/json",
+        "nominatim_url": "https://nominatim.openstreetmap.org/search",
+        "ipinfo_url": "https://ipinfo.io/json",
+        # "fallback", "fanout" or "local" (offline index first)
+        "provider_strategy": "fallback",
+        "provider_deadline_seconds": 8,
+        "http_connect_timeout": 5,
+        "http_read_timeout": 30,
+        "http_pool_hosts": 8,
+        "http_pool_maxsize": 10,
+        "http_host_pool_maxsize": {},
+        # requests per second per host; unlisted hosts are not rate limited
+        "http_rate_limits": {
+            "nominatim.openstreetmap.org": 1.0,
+            "overpass-api.de": 1.0,
+            "overpass.kumi.systems": 1.0,
+            "overpass.private.coffee": 1.0,
+            "maps.googleapis.com": 10.0,
+        },
+        "http_max_retries": 3,
+        "http_backoff_base": 0.5,
+        "http_backoff_max": 30,
     }
 
 
-def read_config() -> Dict[str, Any]:
-    try:
-        if not os.path.exists(_PATH):
-            return _default_config()
-        with open(_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+# config key -> environment variable that overrides it
+_ENV_OVERRIDES = {
+    "google_places_api_key": "GOOGLE_PLACES_API_KEY",
+}
+
+# seconds between checks of config.json for outside changes
+_CHECK_INTERVAL = 2.0
+
+
+class Config:
+    """The parsed contents of one config file, cached in memory.
+
+    get() serves from memory and re-reads the file only when its mtime or
+    size changed, checking at most every `check_interval` seconds. write()
+    replaces the file atomically, so readers never see it half written.
+    """
+
+    def __init__(self, path: str, check_interval: float = _CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._values: Optional[Dict[str, Any]] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> Dict[str, Any]:
         cfg = _default_config()
-        cfg.update({k: data.get(k, v) for k, v in cfg.items()})
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            cfg.update({k: data.get(k, v) for k, v in cfg.items()})
+        except Exception:
+            pass
         return cfg
-    except Exception:
-        return _default_config()
+
+    def values(self) -> Dict[str, Any]:
+        """Return the file's settings over the defaults (shared; do not modify)."""
+        now = time.monotonic()
+        values = self._values
+        if values is not None and now - self._checked < self.check_interval:
+            return values
+        with self._lock:
+            signature = self._stat()
+            if self._values is None or signature != self._signature:
+                self._values = self._load() if signature is not None else _default_config()
+                self._signature = signature
+            self._checked = now
+            return self._values
+
+    def get(self, key: str, default: Any = None) -> Any:
+        env = _ENV_OVERRIDES.get(key)
+        if env and os.environ.get(env):
+            return os.environ[env]
+        return self.values().get(key, default)
+
+    def write(self, data: Dict[str, Any]) -> None:
+        """Replace the file with `data` via a temporary file and rename."""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".config-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.invalidate()
+
+    def update(self, **changes: Any) -> None:
+        """Write the file's current settings with `changes` applied."""
+        cfg = self._load()
+        cfg.update(changes)
+        self.write(cfg)
+
+    def invalidate(self) -> None:
+        """Re-read the file on the next access."""
+        with self._lock:
+            self._values = None
+
+
+_config: Optional[Config] = None
+
+
+def _current() -> Config:
+    # tests and tools repoint _PATH; follow it
+    global _config
+    config = _config
+    if config is None or config.path != _PATH:
+        config = _config = Config(_PATH)
+    return config
+
+
+def reload_config() -> None:
+    """Pick up changes to config.json immediately rather than within _CHECK_INTERVAL."""
+    _current().invalidate()
+
+
+def read_config() -> Dict[str, Any]:
+    """Return a copy of the effective settings, environment overrides applied."""
+    config = _current()
+    cfg = dict(config.values())
+    for key in _ENV_OVERRIDES:
+        cfg[key] = config.get(key)
+    return cfg
 
 
 def write_config(data: Dict[str, Any]) -> None:
     try:
-        with open(_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        _current().write(data)
     except Exception:
         pass
 
 
 def get_cache_ttl() -> int:
-    return int(read_config().get("cache_ttl_seconds", 24 * 3600))
+    return int(_current().get("cache_ttl_seconds", 24 * 3600))
+
+
+def get_cache_stale_grace() -> int:
+    """Return how long past the TTL a cached result may still be served."""
+    return int(_current().get("cache_stale_grace_seconds", 7 * 24 * 3600))
+
+
+def get_cache_limits() -> Tuple[int, int]:
+    """Return the (max rows, max bytes) budget for the query cache."""
+    config = _current()
+    return int(config.get("cache_max_rows", 50000)), int(config.get("cache_max_bytes", 64 * 1024 * 1024))
+
+
+def get_overpass_endpoints() -> List[str]:
+    """Return the Overpass interpreter URLs, preferred first."""
+    endpoints = _current().get("overpass_endpoints")
+    return list(endpoints) if endpoints else _default_config()["overpass_endpoints"]
+
+
+def get_service_url(service: str) -> str:
+    """Return the URL of an upstream service: "google_places", "nominatim" or "ipinfo"."""
+    key = f"{service}_url"
+    return _current().get(key) or _default_config()[key]
+
+
+def get_provider_settings() -> Dict[str, Any]:
+    """Return provider selection settings with the ``provider_`` prefix stripped."""
+    return {k[len("provider_"):]: v for k, v in _current().values().items() if k.startswith("provider_")}
+
+
+def get_http_settings() -> Dict[str, Any]:
+    """Return HTTP client settings with the ``http_`` prefix stripped."""
+    return {k[len("http_"):]: v for k, v in _current().values().items() if k.startswith("http_")}
 
 
 def set_cache_ttl(seconds: int) -> None:
-    cfg = read_config()
-    cfg["cache_ttl_seconds"] = int(seconds)
-    write_config(cfg)
+    try:
+        _current().update(cache_ttl_seconds=int(seconds))
+    except Exception:
+        pass
 
 
 def get_google_api_key() -> Any:
-    return read_config().get("google_places_api_key")
+    """Return the Google Places key; $GOOGLE_PLACES_API_KEY wins over config.json."""
+    return _current().get("google_places_api_key")
+
+
+def get_saved_google_api_key() -> Any:
+    """Return the key stored in config.json, ignoring $GOOGLE_PLACES_API_KEY
+    (what a settings dialog shows and saves)."""
+    return _current().values().get("google_places_api_key")
 
 
 def set_google_api_key(key: Any) -> None:
-    cfg = read_config()
-    cfg["google_places_api_key"] = key
-    write_config(cfg)
+    try:
+        _current().update(google_places_api_key=key)
+    except Exception:
+        pass
@@ -6,104 +6,133 @@ Uses SQLite for local persistence.
 import sqlite3
 import os
 import json
+import threading
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
+from .migrations import has_column, migrate
+from .tiles import disk_bounds
+from .utils import nearest
+
 def _db_path() -> str:
     if os.name == "nt":
         base = os.getenv("LOCALAPPDATA") or os.path.expanduser("~")
     else:
         base = os.getenv("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local/share")
-    d = os.path.join(base, "coffee_finder")
-    os.makedirs(d, exist_ok=True)
-    return os.path.join(d, "user.db")
+    return os.path.join(base, "coffee_finder", "user.db")
 
 _DB_PATH = _db_path()
 
-def _get_conn():
-    """Get or create database connection."""
+# The schema is created on first use rather than on import, for whichever
+# _DB_PATH is current at the time
+_ready_path: Optional[str] = None
+_init_lock = threading.Lock()
+
+def _connect():
     conn = sqlite3.connect(_DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
-def _migrate_db():
-    """Migrate database schema if needed."""
-    conn = _get_conn()
-    cursor = conn.cursor()
-    
-    # Check if home_location table exists and has username column
-    try:
-        cursor.execute("PRAGMA table_info(home_location)")
-        columns = [row[1] for row in cursor.fetchall()]
-        if 'username' not in columns:
-            # Add username column to home_location
-            cursor.execute("ALTER TABLE home_location ADD COLUMN username TEXT DEFAULT 'default_user'")
-            conn.commit()
-    except Exception:
-        pass
-    
-    # Check if saved_places table exists and has username column
-    try:
-        cursor.execute("PRAGMA table_info(saved_places)")
-        columns = [row[1] for row in cursor.fetchall()]
-        if 'username' not in columns:
-            # Add username column to saved_places
-            cursor.execute("ALTER TABLE saved_places ADD COLUMN username TEXT DEFAULT 'default_user'")
-            conn.commit()
-    except Exception:
-        pass
-    
-    conn.close()
+def _get_conn():
+    """Get or create database connection, initializing the schema on first use."""
+    if _ready_path != _DB_PATH:
+        _init_db()
+    return _connect()
 
 def _init_db():
     """Initialize database schema if needed."""
-    conn = _get_conn()
-    cursor = conn.cursor()
-    
-    # Home location (per user)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS home_location (
-            id INTEGER PRIMARY KEY,
-            username TEXT NOT NULL,
-            name TEXT,
-            lat REAL NOT NULL,
-            lng REAL NOT NULL,
-            saved_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(username)
-        )
+    global _ready_path
+    with _init_lock:
+        os.makedirs(os.path.dirname(_DB_PATH) or ".", exist_ok=True)
+        conn = _connect()
+        try:
+            migrate(conn, _MIGRATIONS)
+        finally:
+            conn.close()
+        _ready_path = _DB_PATH
+
+def _add_usernames(conn):
+    """Databases from before user accounts have no username columns."""
+    for table in ("home_location", "saved_places"):
+        if not has_column(conn, table, "username"):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN username TEXT DEFAULT 'default_user'")
+
+def _add_spatial_index(conn):
+    """Spatial index over saved places, kept in sync by triggers."""
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS saved_places_rtree
+            USING rtree(id, min_lat, max_lat, min_lng, max_lng)
+        """)
+    except sqlite3.OperationalError:
+        # sqlite built without rtree: get_saved_places_near scans by lat/lng
+        return
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS saved_places_rtree_insert AFTER INSERT ON saved_places
+        BEGIN
+            INSERT INTO saved_places_rtree VALUES (new.id, new.lat, new.lat, new.lng, new.lng);
+        END
     """)
-    
-    # Saved coffee places (per user)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS saved_places (
-            id INTEGER PRIMARY KEY,
-            username TEXT NOT NULL,
-            name TEXT NOT NULL,
-            lat REAL NOT NULL,
-            lng REAL NOT NULL,
-            address TEXT,
-            rating REAL,
-            source TEXT,
-            saved_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS saved_places_rtree_update AFTER UPDATE OF lat, lng ON saved_places
+        BEGIN
+            UPDATE saved_places_rtree SET min_lat = new.lat, max_lat = new.lat,
+                min_lng = new.lng, max_lng = new.lng WHERE id = new.id;
+        END
     """)
-    
-    # User preferences
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS preferences (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        )
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS saved_places_rtree_delete AFTER DELETE ON saved_places
+        BEGIN
+            DELETE FROM saved_places_rtree WHERE id = old.id;
+        END
+    """)
+    # Index places saved before the spatial index existed
+    conn.execute("""
+        INSERT INTO saved_places_rtree
+        SELECT id, lat, lat, lng, lng FROM saved_places
+        WHERE id NOT IN (SELECT id FROM saved_places_rtree)
     """)
-    
-    conn.commit()
-    conn.close()
-    
-    # Run migrations after creating tables
-    _migrate_db()
 
-# Initialize on import
-_init_db()
+# Append-only; see migrations.py. Tables use IF NOT EXISTS because files
+# created before versioning already have them at user_version 0.
+_MIGRATIONS = (
+    # Home location (per user)
+    """
+    CREATE TABLE IF NOT EXISTS home_location (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        name TEXT,
+        lat REAL NOT NULL,
+        lng REAL NOT NULL,
+        saved_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(username)
+    )
+    """,
+    # Saved coffee places (per user)
+    """
+    CREATE TABLE IF NOT EXISTS saved_places (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        name TEXT NOT NULL,
+        lat REAL NOT NULL,
+        lng REAL NOT NULL,
+        address TEXT,
+        rating REAL,
+        source TEXT,
+        saved_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # User preferences
+    """
+    CREATE TABLE IF NOT EXISTS preferences (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    _add_usernames,
+    _add_spatial_index,
+    "CREATE INDEX IF NOT EXISTS saved_places_username ON saved_places (username)",
+)
 
 # ===== Home Location =====
 
@@ -140,6 +169,20 @@ def clear_home_location(username: str) -> None:
     conn.commit()
     conn.close()
 
+def get_usernames() -> List[str]:
+    """Return every user with a home location or saved places."""
+    try:
+        conn = _get_conn()
+        rows = conn.execute("""
+            SELECT username FROM home_location
+            UNION
+            SELECT username FROM saved_places
+        """).fetchall()
+        conn.close()
+        return [row["username"] for row in rows]
+    except Exception:
+        return []
+
 # ===== Saved Places =====
 
 def save_place(name: str, lat: float, lng: float, username: str, address: str = "", 
@@ -171,6 +214,35 @@ def get_saved_places(username: str) -> List[Dict]:
     except Exception:
         return []
 
+def get_saved_places_near(username: str, lat: float, lng: float, radius: float = 1000,
+                          k: int = 10) -> List[Dict]:
+    """Retrieve a user's saved places within `radius` meters, nearest first.
+
+    Each place gets a `distance_m` field. At most `k` places are returned.
+    """
+    south, west, north, east = disk_bounds(lat, lng, radius)
+    try:
+        conn = _get_conn()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT p.id, p.name, p.lat, p.lng, p.address, p.rating, p.source, p.saved_at
+                FROM saved_places_rtree r JOIN saved_places p ON p.id = r.id
+                WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lng <= ? AND r.max_lng >= ?
+                  AND p.username = ?
+            """, (north, south, east, west, username))
+        except sqlite3.OperationalError:
+            cursor.execute("""
+                SELECT id, name, lat, lng, address, rating, source, saved_at
+                FROM saved_places
+                WHERE username = ? AND lat BETWEEN ? AND ? AND lng BETWEEN ? AND ?
+            """, (username, south, north, west, east))
+        rows = cursor.fetchall()
+        conn.close()
+    except Exception:
+        return []
+    return [dict(place, distance_m=dist) for dist, place in nearest(lat, lng, [dict(r) for r in rows], radius, k)]
+
 def delete_saved_place(place_id: int, username: str) -> None:
     """Delete a saved place by ID (must belong to the user)."""
     conn = _get_conn()
@@ -0,0 +1,54 @@
+"""Address geocoding via Nominatim, cached by normalized address."""
+import re
+import unicodedata
+from typing import Tuple
+
+from . import net
+from .cache import cache_get, cache_set
+from .config import get_service_url
+from .singleflight import Group
+from .trace import span
+
+# addresses rarely move; misses are retried sooner in case of typos fixed upstream
+GEOCODE_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+
+# concurrent lookups of the same address wait for one Nominatim request
+_flights = Group()
+
+
+def normalize_address(address: str) -> str:
+    """Canonical form used as the cache key: case, accents, punctuation and
+    whitespace differences don't produce separate entries."""
+    # compatibility-decompose, then drop the combining marks: "Café" -> "cafe"
+    text = unicodedata.normalize("NFKD", address.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def geocode(address: str) -> Tuple[float, float]:
+    """Return (lat, lng) for an address. Raises RuntimeError if not found."""
+    key = f"geocode:{normalize_address(address)}"
+    with span("geocode"):
+        return _flights.do(key, lambda: _geocode(key, address))
+
+
+def _geocode(key: str, address: str) -> Tuple[float, float]:
+    cached = cache_get(key, max_age_seconds=GEOCODE_TTL)
+    if cached is not None and cached.get("found"):
+        return cached["lat"], cached["lng"]
+    # negative entries expire sooner
+    if cached is not None and cache_get(key, max_age_seconds=NEGATIVE_TTL) is not None:
+        raise RuntimeError("Address not found")
+
+    q = net.get(get_service_url("nominatim"), params={"q": address, "format": "json", "limit": 1})
+    q.raise_for_status()
+    res = q.json()
+    if not res:
+        cache_set(key, {"found": False}, ttl=NEGATIVE_TTL)
+        raise RuntimeError("Address not found")
+    lat = float(res[0]["lat"])
+    lng = float(res[0]["lon"])
+    cache_set(key, {"found": True, "lat": lat, "lng": lng}, ttl=GEOCODE_TTL)
+    return lat, lng
@@ -9,10 +9,13 @@ import os
 import webbrowser
 from typing import Optional
 
-from .config import get_cache_ttl, get_google_api_key, set_cache_ttl, set_google_api_key
-from .database import get_home_location, set_home_location, save_place, get_saved_places, delete_saved_place
+from .config import get_cache_ttl, get_saved_google_api_key, get_service_url, set_cache_ttl, set_google_api_key
+from .database import get_home_location, set_home_location, save_place, get_saved_places, get_saved_places_near, delete_saved_place
 from .utils import parse_latlng
-from .providers import choose_provider
+from .providers import iter_provider_pages
+from . import net
+from .geocode import geocode
+from .cache import stale_reads
 from .login import show_login
 
 
@@ -71,6 +74,7 @@ class CoffeeFinderGUI:
         result_btn_frame.grid(row=7, column=0, columnspan=2, pady=(4, 0))
         ttk.Button(result_btn_frame, text="Save Selected", command=self.save_selected_place).pack(side="left")
         ttk.Button(result_btn_frame, text="View Saved", command=self.view_saved_places).pack(side="left", padx=(4,0))
+        ttk.Button(result_btn_frame, text="Saved Nearby", command=self.view_saved_nearby).pack(side="left", padx=(4,0))
 
         # make layout expand nicely
         root.columnconfigure(0, weight=1)
@@ -101,29 +105,33 @@ class CoffeeFinderGUI:
                 if latlng:
                     lat, lng = parse_latlng(latlng)
                 elif address:
-                    # pass address string to choose_provider via main codepath: use geocoding in main; here we will
-                    # attempt to use Nominatim directly for geocoding to keep GUI self-contained.
-                    import requests
-                    q = requests.get("https://nominatim.openstreetmap.org/search", params={"q": address, "format": "json", "limit": 1}, headers={"User-Agent": "coffee-finder-gui"}, timeout=10)
-                    q.raise_for_status()
-                    res = q.json()
-                    if not res:
-                        raise RuntimeError("Address not found")
-                    lat = float(res[0]["lat"]) ; lng = float(res[0]["lon"])
+                    # geocode via Nominatim (cached, shared with the CLI)
+                    lat, lng = geocode(address)
                 else:
                     # fallback to ip detection
-                    import requests
-                    r = requests.get("https://ipinfo.io/json", timeout=5)
+                    r = net.get(get_service_url("ipinfo"))
                     r.raise_for_status()
                     loc = r.json().get("loc")
                     if not loc:
                         raise RuntimeError("Could not detect location")
                     lat, lng = parse_latlng(loc)
 
-                places = choose_provider(lat, lng, radius=radius, limit=limit)
-                # update UI in main thread
-                self.root.after(0, lambda: self.update_results(places))
-                self.root.after(0, lambda: self.set_status(f"Found {len(places)} places"))
+                # show the first page right away; later pages are appended
+                found = 0
+                stale_before = stale_reads()
+                for i, page in enumerate(iter_provider_pages(lat, lng, radius=radius, limit=limit)):
+                    found += len(page)
+                    # update UI in main thread
+                    if i == 0:
+                        self.root.after(0, lambda page=page: self.update_results(page))
+                    else:
+                        self.root.after(0, lambda page=page: self.append_results(page))
+                    self.root.after(0, lambda n=found: self.set_status(f"Found {n} places, loading more..."))
+                if stale_reads() > stale_before:
+                    status = f"Found {found} places (cached, refreshing...)"
+                else:
+                    status = f"Found {found} places"
+                self.root.after(0, lambda: self.set_status(status))
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Search error", str(e)))
                 self.root.after(0, lambda: self.set_status("Error"))
@@ -133,8 +141,12 @@ class CoffeeFinderGUI:
         threading.Thread(target=worker, daemon=True).start()
 
     def update_results(self, places):
-        self.places = places
+        self.places = []
         self.results.delete(0, tk.END)
+        self.append_results(places)
+
+    def append_results(self, places):
+        self.places = self.places + list(places)
         for p in places:
             name = p.get("name")
             addr = p.get("address") or ""
@@ -153,7 +165,10 @@ class CoffeeFinderGUI:
         ttk.Entry(dlg, textvariable=ttl_hours).grid(row=0, column=1, padx=8, pady=6)
 
         ttk.Label(dlg, text="Google Places API Key").grid(row=1, column=0, sticky="w", padx=8, pady=6)
-        api_var = tk.StringVar(value=get_google_api_key() or os.environ.get("GOOGLE_PLACES_API_KEY") or "")
+        # the file's key, not an environment override, which must not be
+        # written to the file just because the dialog was saved
+        saved_key = get_saved_google_api_key() or ""
+        api_var = tk.StringVar(value=saved_key)
         ttk.Entry(dlg, textvariable=api_var, width=40).grid(row=1, column=1, padx=8, pady=6)
 
         def on_save():
@@ -165,11 +180,13 @@ class CoffeeFinderGUI:
             seconds = int(max(0, hours * 3600))
             set_cache_ttl(seconds)
             key = api_var.get().strip() or None
-            set_google_api_key(key)
-            if key:
-                os.environ["GOOGLE_PLACES_API_KEY"] = key
-            else:
-                os.environ.pop("GOOGLE_PLACES_API_KEY", None)
+            if key != (saved_key or None):
+                set_google_api_key(key)
+                # the new key also wins over the environment in this process
+                if key:
+                    os.environ["GOOGLE_PLACES_API_KEY"] = key
+                else:
+                    os.environ.pop("GOOGLE_PLACES_API_KEY", None)
             messagebox.showinfo("Saved", "Settings saved.")
             dlg.destroy()
 
@@ -222,14 +239,7 @@ class CoffeeFinderGUI:
             if latlng:
                 lat, lng = parse_latlng(latlng)
             elif address:
-                import requests
-                q = requests.get("https://nominatim.openstreetmap.org/search", params={"q": address, "format": "json", "limit": 1}, headers={"User-Agent": "coffee-finder-gui"}, timeout=10)
-                q.raise_for_status()
-                res = q.json()
-                if not res:
-                    raise RuntimeError("Address not found")
-                lat = float(res[0]["lat"])
-                lng = float(res[0]["lon"])
+                lat, lng = geocode(address)
             set_home_location(lat, lng, self.username, address or latlng)
             messagebox.showinfo("Saved", f"Home location saved: {lat},{lng}")
         except Exception as e:
@@ -256,9 +266,34 @@ class CoffeeFinderGUI:
         if not saved:
             messagebox.showinfo("No Saved Places", "No favorites yet. Save places from search results.")
             return
-        
+        self._show_saved_dialog(saved, "Saved Places")
+
+    def view_saved_nearby(self):
+        """Show saved places within the search radius of the lat,lng field (or home)."""
+        latlng = self.latlng_var.get().strip()
+        try:
+            if latlng:
+                lat, lng = parse_latlng(latlng)
+            else:
+                home = get_home_location(self.username)
+                if not home:
+                    messagebox.showwarning("No Location", "Enter a lat,lng or save a home location first.")
+                    return
+                lat, lng = home["lat"], home["lng"]
+            radius = self.radius_var.get()
+            limit = self.limit_var.get()
+        except Exception as e:
+            messagebox.showerror("Error", f"Invalid location: {str(e)}")
+            return
+        saved = get_saved_places_near(self.username, lat, lng, radius=radius, k=limit)
+        if not saved:
+            messagebox.showinfo("No Saved Places", f"No favorites within {radius} m.")
+            return
+        self._show_saved_dialog(saved, f"Saved Places within {radius} m")
+
+    def _show_saved_dialog(self, saved, title: str):
         dlg = tk.Toplevel(self.root)
-        dlg.title("Saved Places")
+        dlg.title(title)
         dlg.transient(self.root)
         dlg.resizable(True, True)
         
@@ -274,6 +309,8 @@ class CoffeeFinderGUI:
         
         for p in saved:
             label = f"{p['name']} - {p['address'][:50] if p['address'] else 'N/A'}"
+            if p.get("distance_m") is not None:
+                label = f"{p['name']} - {int(p['distance_m'])} m - {p['address'][:50] if p['address'] else 'N/A'}"
             lb.insert(tk.END, label)
         
         # Button frame
@@ -0,0 +1,83 @@
+"""Incremental parsing of large JSON responses.
+
+Only the items of one top-level array are materialized, one at a time,
+so memory stays flat regardless of response size.
+"""
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+_decoder = json.JSONDecoder()
+_WS = " \t\r\n"
+
+
+def iter_array_items(chunks: Iterable[bytes], key: str,
+                     trailer: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    """Yield the items of the array stored under `key` as bytes arrive.
+
+    `chunks` is any iterable of byte strings, e.g. a streamed response's
+    iter_content(). Raises ValueError if the stream ends mid-array.
+
+    Iteration normally stops at the end of the array. If a `trailer` dict
+    is given, the rest of the stream is read as well and the top-level
+    fields following the array (e.g. Overpass' "remark") are stored in it.
+    """
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    text = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    in_array = False
+    chunks = iter(chunks)
+    eof = False
+    while True:
+        if not in_array:
+            m = start.search(buf)
+            if m:
+                in_array = True
+                pos = m.end()
+            elif eof:
+                return
+            else:
+                # keep a tail in case the key is split across chunks
+                buf = buf[-(len(key) + 16):]
+        if in_array:
+            while True:
+                while pos < len(buf) and (buf[pos] in _WS or buf[pos] == ","):
+                    pos += 1
+                if pos >= len(buf):
+                    break
+                if buf[pos] == "]":
+                    if trailer is not None:
+                        rest = buf[pos + 1:] + "".join(text.decode(c) for c in chunks)
+                        trailer.update(_parse_trailer(rest + text.decode(b"", final=True)))
+                    return
+                try:
+                    item, end = _decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise ValueError(f"truncated JSON array {key!r}")
+                    break  # item is incomplete; read more
+                if end >= len(buf) and not eof:
+                    break  # a number might continue in the next chunk
+                yield item
+                pos = end
+            buf = buf[pos:]
+            pos = 0
+        if eof:
+            raise ValueError(f"truncated JSON array {key!r}")
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buf += text.decode(b"", final=True)
+        else:
+            buf += text.decode(chunk)
+
+
+def _parse_trailer(rest: str) -> Dict[str, Any]:
+    """Parse what follows the array, e.g. ', "remark": "..."}', as an object."""
+    try:
+        fields = json.loads("{" + rest.lstrip(_WS + ","))
+    except ValueError:
+        return {}
+    return fields if isinstance(fields, dict) else {}
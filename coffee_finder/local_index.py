@@ -0,0 +1,242 @@
+"""Offline POI index built from OpenStreetMap extracts.
+
+`build_index` ingests an OSM XML (.osm, .osm.bz2), GeoJSON or PBF extract
+(PBF needs the optional `osmium` package), keeps amenity=cafe and
+shop=coffee nodes and ways, and writes them to an SQLite file with an
+R*Tree spatial index. Searches then need no network at all.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import xml.etree.ElementTree as ET
+
+_SCHEMA = (
+    "CREATE TABLE pois (id INTEGER PRIMARY KEY, name TEXT NOT NULL, lat REAL NOT NULL, lng REAL NOT NULL, address TEXT)",
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)",
+)
+_RTREE = "CREATE VIRTUAL TABLE pois_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+_FALLBACK_INDEX = "CREATE INDEX pois_lat_lng ON pois (lat, lng)"
+
+
+def index_path() -> str:
+    from .database import _db_path
+    # Use same directory as user database
+    return os.path.join(os.path.dirname(_db_path()), "poi.db")
+
+
+def has_index(path: Optional[str] = None) -> bool:
+    return os.path.exists(path or index_path())
+
+
+def _is_coffee(tags: Dict[str, str]) -> bool:
+    return tags.get("amenity") == "cafe" or tags.get("shop") == "coffee"
+
+
+def _open(path: str):
+    # the decompressors and the XML parser are only needed to build an index
+    if path.endswith(".bz2"):
+        import bz2
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _iter_osm_objects(path: str) -> Iterator["ET.Element"]:
+    """Yield each top-level OSM object, freeing it once the caller is done."""
+    import xml.etree.ElementTree as ET
+    with _open(path) as f:
+        root = None
+        depth = 0
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = el
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                yield el
+                # drop parsed objects so memory stays flat on large extracts
+                root.clear()
+
+
+def _iter_osm_xml(path: str) -> Iterator[Dict]:
+    """Yield Overpass-style elements for coffee nodes and ways.
+
+    Ways need their nodes' coordinates, so a second pass over the file
+    collects just the nodes referenced by coffee ways.
+    """
+    way_refs: Dict[str, Tuple[Dict[str, str], List[str]]] = {}
+    for el in _iter_osm_objects(path):
+        if el.tag in ("node", "way"):
+            tags = {t.get("k"): t.get("v") for t in el.iter("tag")}
+            if _is_coffee(tags):
+                if el.tag == "node":
+                    yield {"type": "node", "lat": float(el.get("lat")), "lon": float(el.get("lon")), "tags": tags}
+                else:
+                    way_refs[el.get("id")] = (tags, [nd.get("ref") for nd in el.iter("nd")])
+    if not way_refs:
+        return
+    wanted = {ref for _, refs in way_refs.values() for ref in refs}
+    coords: Dict[str, Tuple[float, float]] = {}
+    for el in _iter_osm_objects(path):
+        if el.tag == "node" and el.get("id") in wanted:
+            coords[el.get("id")] = (float(el.get("lat")), float(el.get("lon")))
+    for tags, refs in way_refs.values():
+        center = _bbox_center([coords[r] for r in refs if r in coords])
+        if center:
+            yield {"type": "way", "center": {"lat": center[0], "lon": center[1]}, "tags": tags}
+
+
+def _bbox_center(points: List[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    # same definition as Overpass' "out center"
+    if not points:
+        return None
+    lats = [p[0] for p in points]
+    lngs = [p[1] for p in points]
+    return (min(lats) + max(lats)) / 2, (min(lngs) + max(lngs)) / 2
+
+
+def _flatten(coords) -> List[Tuple[float, float]]:
+    if coords and isinstance(coords[0], (int, float)):
+        return [(coords[1], coords[0])]
+    return [p for c in coords for p in _flatten(c)]
+
+
+def _iter_geojson(path: str) -> Iterator[Dict]:
+    with _open(path) as f:
+        data = json.load(f)
+    for feature in data.get("features", []):
+        props = feature.get("properties") or {}
+        # osmtogeojson nests tags; other exporters put them at the top level
+        tags = props.get("tags") if isinstance(props.get("tags"), dict) else props
+        geometry = feature.get("geometry") or {}
+        if not _is_coffee(tags) or not geometry.get("coordinates"):
+            continue
+        if geometry.get("type") == "Point":
+            lng, lat = geometry["coordinates"][:2]
+            yield {"type": "node", "lat": lat, "lon": lng, "tags": tags}
+        else:
+            center = _bbox_center(_flatten(geometry["coordinates"]))
+            if center:
+                yield {"type": "way", "center": {"lat": center[0], "lon": center[1]}, "tags": tags}
+
+
+def _iter_pbf(path: str) -> Iterator[Dict]:
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Reading .pbf extracts requires the 'osmium' package (pip install osmium)")
+
+    found: List[Dict] = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            tags = {t.k: t.v for t in n.tags}
+            if _is_coffee(tags):
+                found.append({"type": "node", "lat": n.location.lat, "lon": n.location.lon, "tags": tags})
+
+        def way(self, w):
+            tags = {t.k: t.v for t in w.tags}
+            if _is_coffee(tags):
+                center = _bbox_center([(nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()])
+                if center:
+                    found.append({"type": "way", "center": {"lat": center[0], "lon": center[1]}, "tags": tags})
+
+    Handler().apply_file(path, locations=True)
+    return iter(found)
+
+
+def _iter_elements(path: str) -> Iterator[Dict]:
+    name = path.lower()
+    if name.endswith(".pbf"):
+        return _iter_pbf(path)
+    if name.endswith((".geojson", ".json", ".geojson.gz", ".json.gz")):
+        return _iter_geojson(path)
+    return _iter_osm_xml(path)
+
+
+def _create(conn: sqlite3.Connection) -> bool:
+    for stmt in _SCHEMA:
+        conn.execute(stmt)
+    try:
+        conn.execute(_RTREE)
+        return True
+    except sqlite3.OperationalError:
+        # sqlite built without the rtree module
+        conn.execute(_FALLBACK_INDEX)
+        return False
+
+
+def build_index(source: str, path: Optional[str] = None) -> int:
+    """Build the index from an OSM extract and return the number of places.
+
+    The new index replaces the old one atomically once it is complete.
+    """
+    from .providers import _place_from_element
+    path = path or index_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    count = 0
+    try:
+        conn = sqlite3.connect(tmp)
+        rtree = _create(conn)
+        for el in _iter_elements(source):
+            place = _place_from_element(el)
+            if place is None:
+                continue
+            cur = conn.execute("INSERT INTO pois (name, lat, lng, address) VALUES (?, ?, ?, ?)",
+                               (place["name"], place["lat"], place["lng"], place["address"]))
+            if rtree:
+                conn.execute("INSERT INTO pois_rtree VALUES (?, ?, ?, ?, ?)",
+                             (cur.lastrowid, place["lat"], place["lat"], place["lng"], place["lng"]))
+            count += 1
+        conn.execute("INSERT INTO meta VALUES ('source', ?)", (os.path.abspath(source),))
+        conn.execute("INSERT INTO meta VALUES ('rtree', ?)", ("1" if rtree else "0",))
+        conn.commit()
+        conn.close()
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return count
+
+
+def query_bbox(south: float, west: float, north: float, east: float,
+               path: Optional[str] = None) -> List[Dict]:
+    """Return indexed places inside the box, as place dicts without distance."""
+    conn = sqlite3.connect(path or index_path())
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'rtree'").fetchone()
+        if row and row[0] == "1":
+            rows = conn.execute(
+                """SELECT p.name, p.lat, p.lng, p.address FROM pois_rtree r JOIN pois p ON p.id = r.id
+                   WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lng <= ? AND r.max_lng >= ?""",
+                (north, south, east, west)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT name, lat, lng, address FROM pois WHERE lat BETWEEN ? AND ? AND lng BETWEEN ? AND ?",
+                (south, north, west, east)).fetchall()
+    finally:
+        conn.close()
+    return [{"name": name, "lat": lat, "lng": lng, "address": address or "",
+             "distance_m": None, "rating": None, "source": "local"} for name, lat, lng, address in rows]
+
+
+def index_info(path: Optional[str] = None) -> Dict[str, str]:
+    """Return metadata about the index (source file, place count)."""
+    conn = sqlite3.connect(path or index_path())
+    try:
+        info = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        info["places"] = str(conn.execute("SELECT COUNT(*) FROM pois").fetchone()[0])
+    finally:
+        conn.close()
+    return info
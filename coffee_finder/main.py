@@ -1,16 +1,23 @@
 """CLI entry and orchestration for Coffee Finder."""
 import os
+import sys
 import argparse
 from typing import List
-import requests
 
-from .providers import choose_provider, search_google_places
+from . import local_index, net, trace
+from .config import get_service_url
+from .providers import choose_provider, filter_by_rating, iter_provider_pages, search_google_places
 from .utils import parse_latlng
+from .geocode import geocode
+from .cache import stale_reads, wait_for_refreshes
+
+# how long the CLI waits on exit for background refreshes of stale results
+REFRESH_WAIT_SECONDS = 30
 
 
 def detect_location_by_ip() -> tuple:
     try:
-        r = requests.get("https://ipinfo.io/json", timeout=5)
+        r = net.get(get_service_url("ipinfo"))
         r.raise_for_status()
         j = r.json()
         loc = j.get("loc")
@@ -33,7 +40,92 @@ def format_place(p: dict) -> str:
     return " ".join(parts)
 
 
+def _finish_refresh() -> None:
+    """Let background refreshes of stale results finish before exiting."""
+    print("\nShowing cached results; refreshing...", flush=True)
+    wait_for_refreshes(REFRESH_WAIT_SECONDS)
+
+
+def _print_streamed(lat: float, lng: float, args) -> None:
+    """Print each page of results as soon as the provider returns it."""
+    print(f"Searching near {lat},{lng} (radius {args.radius} m):\n", flush=True)
+    count = 0
+    stale_before = stale_reads()
+    for page in iter_provider_pages(lat, lng, radius=args.radius, limit=args.limit,
+                                    min_rating=args.min_rating):
+        for p in filter_by_rating(page, args.min_rating):
+            count += 1
+            print(f"{count}. {format_place(p)}", flush=True)
+    if not count:
+        print("No coffee places found within radius.")
+    else:
+        print(f"\nFound {count} places.")
+    if stale_reads() > stale_before:
+        _finish_refresh()
+
+
+def _run_batch(args) -> None:
+    """Stream JSON lines to stdout and a throughput summary to stderr."""
+    from . import batch
+    source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    try:
+        summary = batch.run_batch(source, sys.stdout, radius=args.radius, limit=args.limit,
+                                  min_rating=args.min_rating, workers=args.workers, order=args.order)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    wait_for_refreshes(REFRESH_WAIT_SECONDS)
+    print(f"{summary['inputs']} inputs ({summary['errors']} failed) in {summary['elapsed_s']} s, "
+          f"{summary['throughput_per_s']}/s", file=sys.stderr)
+    for stage, t in summary["stages_ms"].items():
+        print(f"  {stage}: mean {t['mean']} ms, p50 {t['p50']} ms, p95 {t['p95']} ms", file=sys.stderr)
+
+
+def index_main(argv: List[str]):
+    """`coffee-finder index ...`: manage the offline POI index."""
+    parser = argparse.ArgumentParser(prog="coffee-finder index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build the index from an OSM extract")
+    build.add_argument("source", help="OSM extract: .osm/.osm.bz2 XML, .geojson, or .pbf (needs osmium)")
+    build.add_argument("--output", help="Index file (default: poi.db in the data directory)")
+    info = sub.add_parser("info", help="Show what the index contains")
+    info.add_argument("--output", help="Index file (default: poi.db in the data directory)")
+    args = parser.parse_args(argv)
+
+    path = args.output or local_index.index_path()
+    if args.command == "build":
+        count = local_index.build_index(args.source, path)
+        print(f"Indexed {count} coffee places from {args.source} into {path}")
+        print('Set "provider_strategy": "local" in config.json to search it first.')
+    elif not local_index.has_index(path):
+        print(f"No index at {path}. Run 'coffee-finder index build FILE' first.")
+    else:
+        for k, v in sorted(local_index.index_info(path).items()):
+            print(f"{k}: {v}")
+
+
+def cache_main(argv: List[str]):
+    """`coffee-finder cache ...`: manage the query cache."""
+    parser = argparse.ArgumentParser(prog="coffee-finder cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm", help="Prefetch results around every user's home and saved places")
+    warm.add_argument("--radius", type=int, default=1000, help="Search radius to warm in meters (default 1000)")
+    args = parser.parse_args(argv)
+
+    from . import prefetch
+    stats = prefetch.warm_cache(radius=args.radius)
+    print(f"Warmed {stats['warmed']} of {stats['points']} locations "
+          f"({stats['fresh']} already fresh, {stats['errors']} failed)")
+
+
 def main(argv: List[str] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "index":
+        return index_main(argv[1:])
+    if argv and argv[0] == "cache":
+        return cache_main(argv[1:])
+
     parser = argparse.ArgumentParser(prog="coffee-finder")
     group = parser.add_mutually_exclusive_group()
     group.add_argument("--latlng", help="Latitude,Longitude (e.g. 40.7128,-74.0060)")
@@ -43,36 +135,71 @@ def main(argv: List[str] = None):
     parser.add_argument("--radius", type=int, default=1000, help="Search radius in meters (default 1000)")
     parser.add_argument("--limit", type=int, default=10, help="Max results (default 10)")
     parser.add_argument("--min-rating", type=float, help="Minimum rating to include (Google only)")
+    parser.add_argument("--stream", action="store_true", help="Print results page by page as they arrive")
+    group.add_argument("--batch", metavar="FILE", help="Search every 'lat,lng' or address line of FILE ('-' for stdin), print JSON lines")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent searches in --batch mode (default 4)")
+    parser.add_argument("--order", choices=("input", "completion"), default="input",
+                        help="--batch output order (default input)")
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage timing breakdown to stderr")
+    parser.add_argument("--trace-file", metavar="FILE", help="Append timing spans to FILE as JSON lines")
     args = parser.parse_args(argv)
 
-    if args.latlng:
-        lat, lng = parse_latlng(args.latlng)
-    elif args.lat is not None and args.lng is not None:
-        lat, lng = args.lat, args.lng
-    elif args.address:
-        # geocode via Nominatim
-        q = requests.get("https://nominatim.openstreetmap.org/search", params={"q": args.address, "format": "json", "limit": 1}, headers={"User-Agent": "coffee-finder-app"}, timeout=10)
-        q.raise_for_status()
-        res = q.json()
-        if not res:
-            raise RuntimeError("Address not found")
-        lat = float(res[0]["lat"]) ; lng = float(res[0]["lon"])
-    else:
-        lat, lng = detect_location_by_ip()
+    trace_file = None
+    if args.trace_file:
+        trace_file = open(args.trace_file, "a", encoding="utf-8")
+        trace.enable(trace.jsonl_exporter(trace_file))
+    elif args.profile:
+        trace.enable()
+    try:
+        with trace.span("main"):
+            _search_main(args)
+    finally:
+        if trace.enabled():
+            if args.profile:
+                print(trace.format_summary(), file=sys.stderr)
+            trace.disable()
+            trace.reset()
+        if trace_file is not None:
+            trace_file.close()
+
+
+def _search_main(args) -> None:
+    if args.batch:
+        _run_batch(args)
+        return
+
+    with trace.span("locate"):
+        if args.latlng:
+            lat, lng = parse_latlng(args.latlng)
+        elif args.lat is not None and args.lng is not None:
+            lat, lng = args.lat, args.lng
+        elif args.address:
+            # geocode via Nominatim (cached)
+            lat, lng = geocode(args.address)
+        else:
+            with trace.span("detect_location"):
+                lat, lng = detect_location_by_ip()
+
+    if args.stream:
+        _print_streamed(lat, lng, args)
+        return
 
     # prefer Google if API key is set
+    stale_before = stale_reads()
     places = choose_provider(lat, lng, radius=args.radius, limit=args.limit, min_rating=args.min_rating)
     # filter by min-rating if provided
-    if args.min_rating is not None:
-        places = [p for p in places if (p.get("rating") is not None and p.get("rating") >= args.min_rating)]
+    places = filter_by_rating(places, args.min_rating)
 
     if not places:
         print("No coffee places found within radius.")
         return
 
-    print(f"Found {len(places)} places near {lat},{lng} (radius {args.radius} m):\n")
-    for i, p in enumerate(places, start=1):
-        print(f"{i}. {format_place(p)}")
+    with trace.span("output"):
+        print(f"Found {len(places)} places near {lat},{lng} (radius {args.radius} m):\n")
+        for i, p in enumerate(places, start=1):
+            print(f"{i}. {format_place(p)}")
+    if stale_reads() > stale_before:
+        _finish_refresh()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""Versioned SQLite schema migrations.
+
+Each database keeps an ordered tuple of migrations; the number applied is
+stored in the file's `PRAGMA user_version`, so opening a current database
+costs one pragma read. A migration is a single SQL statement or a
+function taking the connection, and is applied in its own transaction
+together with the version bump: a failed migration leaves the database at
+the previous version, to be retried on the next open.
+
+Migrations are append-only: never edit or reorder a shipped one, add a new
+one instead.
+"""
+import sqlite3
+from typing import Callable, Sequence, Union
+
+Migration = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    """For migrations that must tolerate databases created before versioning."""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def migrate(conn: sqlite3.Connection, migrations: Sequence[Migration]) -> int:
+    """Apply the migrations `conn` has not seen yet; return how many ran.
+
+    Raises RuntimeError if the database is newer than `migrations`.
+    """
+    target = len(migrations)
+    version = schema_version(conn)
+    if version == target:
+        return 0
+    applied = 0
+    while True:
+        # take the write lock before re-reading the version so that two
+        # processes opening the same file don't both apply a migration
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = schema_version(conn)
+            if version > target:
+                raise RuntimeError(f"database schema version {version} is newer than this "
+                                   f"version of Coffee Finder supports ({target})")
+            if version == target:
+                conn.rollback()
+                return applied
+            step = migrations[version]
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+            # PRAGMA does not take parameters
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied += 1
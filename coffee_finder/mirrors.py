@@ -0,0 +1,181 @@
+"""Hedged requests across interchangeable API mirrors.
+
+A MirrorPool tracks recent latency and failures per endpoint. A call goes
+to the fastest healthy mirror first; if it hasn't answered by that
+mirror's p95 latency, the next mirror is tried in parallel and the first
+success wins. Mirrors that keep failing or are very slow are ejected for
+a while.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from .scheduler import bind_priority
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="mirror")
+        return _executor
+
+
+class Mirror:
+    """Latency and health record for one endpoint."""
+
+    def __init__(self, url: str, window: int = 50):
+        self.url = url
+        self.latencies: deque = deque(maxlen=window)
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+
+class MirrorPool:
+    """Issue hedged calls over a list of equivalent endpoints."""
+
+    def __init__(self, urls: List[str], default_hedge_delay: float = 3.0,
+                 min_hedge_delay: float = 0.25, max_hedge_delay: float = 10.0,
+                 eject_after: int = 3, eject_seconds: float = 300.0, slow_seconds: float = 20.0,
+                 min_samples: int = 5):
+        if not urls:
+            raise ValueError("MirrorPool needs at least one URL")
+        self.mirrors = [Mirror(u) for u in urls]
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.slow_seconds = slow_seconds
+        self.min_samples = min_samples
+        self.stats = {"calls": 0, "hedged": 0, "failures": 0, "ejections": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self) -> List[str]:
+        return [m.url for m in self.mirrors]
+
+    def ranked(self) -> List[Mirror]:
+        """Healthy mirrors by median latency (unknown first, in config
+        order), then ejected ones by how soon they return."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [m for m in self.mirrors if m.healthy(now)]
+            ejected = sorted((m for m in self.mirrors if not m.healthy(now)), key=lambda m: m.ejected_until)
+            healthy.sort(key=lambda m: m.percentile(0.5) or 0.0)
+        return healthy + ejected
+
+    def hedge_delay(self, mirror: Mirror) -> float:
+        with self._lock:
+            if len(mirror.latencies) < self.min_samples:
+                return self.default_hedge_delay
+            p95 = mirror.percentile(0.95)
+        return min(max(p95, self.min_hedge_delay), self.max_hedge_delay)
+
+    def _record(self, mirror: Mirror, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                mirror.latencies.append(elapsed)
+            if ok and elapsed < self.slow_seconds:
+                mirror.failures = 0
+                return
+            mirror.failures += 1
+            if not ok:
+                self.stats["failures"] += 1
+            if mirror.failures >= self.eject_after:
+                mirror.failures = 0
+                mirror.ejected_until = time.monotonic() + self.eject_seconds
+                self.stats["ejections"] += 1
+
+    def _launch(self, fn: Callable[[str], Any], mirror: Mirror):
+        started = time.monotonic()
+
+        def run():
+            try:
+                result = fn(mirror.url)
+            except Exception:
+                self._record(mirror, time.monotonic() - started, False)
+                raise
+            self._record(mirror, time.monotonic() - started, True)
+            return result
+
+        # the pool thread requests at the caller's priority
+        future = _get_executor().submit(bind_priority(run))
+        future.mirror = mirror
+        return future
+
+    def call(self, fn: Callable[[str], Any]) -> Any:
+        """Call `fn(url)` hedged across mirrors and return the first success.
+
+        Results of calls that lose the race are closed if they have a
+        close() method (e.g. streamed HTTP responses). Raises the last
+        error if every mirror fails.
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+        queue = self.ranked()
+        pending = {self._launch(fn, queue.pop(0))}
+        last_error: Optional[BaseException] = None
+        winner = None
+        while pending:
+            delay = self.hedge_delay(next(iter(pending)).mirror) if queue else None
+            done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    winner = f
+                    break
+                last_error = f.exception()
+            if winner is not None:
+                break
+            if queue and (not done or not pending):
+                # primary is slow (hedge) or every in-flight call failed
+                if pending:
+                    with self._lock:
+                        self.stats["hedged"] += 1
+                pending.add(self._launch(fn, queue.pop(0)))
+        for f in pending:
+            if not f.cancel():
+                f.add_done_callback(_close_result)
+        if winner is None:
+            raise last_error or RuntimeError("all mirrors failed")
+        return winner.result()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return per-mirror latency/health figures and call counters."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "stats": dict(self.stats),
+                "mirrors": [{
+                    "url": m.url,
+                    "samples": len(m.latencies),
+                    "p50": m.percentile(0.5),
+                    "p95": m.percentile(0.95),
+                    "ejected": not m.healthy(now),
+                } for m in self.mirrors],
+            }
+
+
+def _close_result(future) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
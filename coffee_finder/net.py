@@ -0,0 +1,106 @@
+"""Shared HTTP client used for every network call.
+
+One requests.Session keeps connections alive per host, so Google paging,
+Overpass and geocoding calls reuse warm TCP/TLS connections instead of
+handshaking on every request. Requests are paced per host by the
+scheduler and retried on 429/503.
+"""
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+from urllib.parse import urlsplit
+
+from .config import get_http_settings
+from .scheduler import RETRY_STATUSES, get_scheduler
+
+if TYPE_CHECKING:
+    import requests
+
+USER_AGENT = "coffee-finder-app"
+
+_session: Optional["requests.Session"] = None
+_lock = threading.Lock()
+
+
+def _new_session() -> "requests.Session":
+    # requests (and urllib3) take a while to import; only pay for it when
+    # a request is actually made, not for cached searches
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    settings = get_http_settings()
+    pool = int(settings["pool_maxsize"])
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"})
+    # one connection pool per host, up to `pool` sockets kept alive each
+    adapter = HTTPAdapter(pool_connections=int(settings["pool_hosts"]), pool_maxsize=pool)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for host, size in (settings.get("host_pool_maxsize") or {}).items():
+        host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(size))
+        session.mount(f"https://{host}/", host_adapter)
+        session.mount(f"http://{host}/", host_adapter)
+    return session
+
+
+def get_session() -> "requests.Session":
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _new_session()
+    return _session
+
+
+def reset_session() -> None:
+    """Close pooled connections; the next request opens a fresh session."""
+    global _session
+    with _lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def _timeout(timeout: Any) -> Any:
+    if timeout is not None:
+        return timeout
+    settings = get_http_settings()
+    return (float(settings["connect_timeout"]), float(settings["read_timeout"]))
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+def request(method: str, url: str, timeout: Any = None, **kwargs) -> "requests.Response":
+    """Send a request through the shared session.
+
+    `timeout` defaults to the configured (connect, read) timeouts. The
+    request waits for its host's rate limit, and 429/503 answers are
+    retried after Retry-After or a jittered backoff, up to
+    ``http_max_retries`` times; the last answer is returned as is.
+    """
+    host = host_of(url)
+    scheduler = get_scheduler()
+    retries = int(get_http_settings().get("max_retries", 3))
+    timeout = _timeout(timeout)
+    for attempt in range(retries + 1):
+        scheduler.acquire(host)
+        response = get_session().request(method, url, timeout=timeout, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            return response
+        delay = scheduler.throttled(host, attempt, response.headers.get("Retry-After"))
+        if delay > scheduler.backoff_max:
+            # the server wants a longer pause than we are willing to block for
+            return response
+        response.close()
+        scheduler.retried()
+    return response
+
+
+def get(url: str, **kwargs) -> "requests.Response":
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> "requests.Response":
+    return request("POST", url, **kwargs)
@@ -0,0 +1,67 @@
+"""Background cache warming around the places users search from.
+
+Every user's home location and saved places are likely search centres.
+The prefetcher refreshes the Overpass tiles around them shortly before
+they expire, at background priority, so the next search there is served
+from the cache. Google results are not cached and are not prefetched.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import database
+from .cache import cache_get
+from .config import get_cache_ttl
+from .providers import _fetch_radius, _tile_key, refresh_overpass_area
+from .scheduler import BACKGROUND, priority, run_periodically
+from .tiles import covering_tiles, encode, tile_precision
+
+# tiles older than this fraction of the TTL are refreshed ahead of expiry
+REFRESH_FRACTION = 0.8
+
+
+def prefetch_points() -> List[Tuple[float, float]]:
+    """Return the home and saved-place coordinates of every user.
+
+    Points in the same ~150 m cell are only listed once.
+    """
+    points: List[Tuple[float, float]] = []
+    seen = set()
+    for username in database.get_usernames():
+        home = database.get_home_location(username)
+        places = ([home] if home else []) + database.get_saved_places(username)
+        for p in places:
+            if p.get("lat") is None or p.get("lng") is None:
+                continue
+            cell = encode(p["lat"], p["lng"], 7)
+            if cell not in seen:
+                seen.add(cell)
+                points.append((p["lat"], p["lng"]))
+    return points
+
+
+def warm_cache(radius: int = 1000, points: Optional[Iterable[Tuple[float, float]]] = None) -> Dict[str, int]:
+    """Refresh the cached tiles around each point that are missing or
+    close to expiry. Returns counts of points warmed, skipped and failed."""
+    if points is None:
+        points = prefetch_points()
+    max_age = int(get_cache_ttl() * REFRESH_FRACTION)
+    precision = tile_precision(radius)
+    fetch_radius = _fetch_radius(radius)
+    stats = {"points": 0, "warmed": 0, "fresh": 0, "errors": 0}
+    with priority(BACKGROUND):
+        for lat, lng in points:
+            stats["points"] += 1
+            tiles = covering_tiles(lat, lng, fetch_radius, precision)
+            if all(cache_get(_tile_key(t), max_age_seconds=max_age) is not None for t in tiles):
+                stats["fresh"] += 1
+                continue
+            try:
+                refresh_overpass_area(lat, lng, radius)
+                stats["warmed"] += 1
+            except Exception:
+                stats["errors"] += 1
+    return stats
+
+
+def start_prefetcher(interval_seconds: int = 3600, radius: int = 1000) -> None:
+    """Run warm_cache() periodically on a daemon thread (for long-lived processes)."""
+    run_periodically("cache-prefetcher", lambda: warm_cache(radius), interval_seconds)
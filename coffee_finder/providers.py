@@ -1,86 +1,270 @@
 """Provider implementations: Google Places (optional) and OpenStreetMap Overpass fallback."""
-from typing import List, Dict, Optional
-import os
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from difflib import SequenceMatcher
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import re
 
-from .utils import haversine_distance
-from .cache import cache_get, cache_set
-from .config import get_cache_ttl, get_google_api_key
+from . import net
+from .utils import haversine_distance, nearest
+from .tiles import covering_tiles, disk_bounds, encode, tile_precision, union_bbox
+from . import local_index
+from .cache import (_count_stale, cache_get, cache_get_area, cache_set, cache_set_area, schedule_refresh,
+                    stale_reads)
+from .config import (get_cache_stale_grace, get_cache_ttl, get_google_api_key, get_overpass_endpoints,
+                     get_provider_settings, get_service_url)
+from .jsonstream import iter_array_items
+from .mirrors import MirrorPool
+from .scheduler import bind_priority
+from .singleflight import Group
+from .trace import span
 
 
 def _distance_from(center_lat, center_lng, lat, lng) -> float:
     return haversine_distance(center_lat, center_lng, lat, lng)
 
 
-def search_overpass(lat: float, lng: float, radius: int = 1000, limit: int = 20) -> List[Dict]:
-    """Search Overpass API for cafes/coffee shops near the point.
+def _place_from_element(el: Dict) -> Optional[Dict]:
+    """Convert an Overpass element to a place dict (without distance)."""
+    tags = el.get("tags", {})
+    name = tags.get("name") or tags.get("brand")
+    if not name:
+        return None
+    # node has lat/lon, way has center
+    if el.get("type") == "node":
+        el_lat = el.get("lat")
+        el_lon = el.get("lon")
+    else:
+        center = el.get("center") or {}
+        el_lat = center.get("lat")
+        el_lon = center.get("lon")
+    if el_lat is None or el_lon is None:
+        return None
+    address_parts = []
+    for k in ("addr:housenumber","addr:street","addr:city","addr:postcode","addr:country"):
+        if tags.get(k):
+            address_parts.append(tags.get(k))
+    address = ", ".join(address_parts) if address_parts else tags.get("addr:full") or ""
+    return {
+        "name": name,
+        "lat": el_lat,
+        "lng": el_lon,
+        "address": address,
+        "distance_m": None,
+        "rating": None,
+        "source": "overpass",
+    }
 
-    Returns list of dicts: name, lat, lng, address, distance_m, source
+
+# Upstream fetches are widened to the next of these radii so that later,
+# smaller searches around the same point are answered from the cache.
+OVERPASS_FETCH_RADII = (1000, 2000)
+
+
+def _fetch_radius(radius: int) -> int:
+    for r in OVERPASS_FETCH_RADII:
+        if r >= radius:
+            return r
+    return radius
+
+
+def _rank(candidates: Iterable[Dict], lat: float, lng: float, radius: float,
+          limit: Optional[int] = None) -> List[Dict]:
+    """Recompute distances from the query point, drop far places and return
+    the nearest `limit` (all if None), sorted by distance."""
+    # one batch distance pass plus a top-k selection: O(n log k)
+    with span("rank"):
+        ranked = nearest(lat, lng, list(candidates), radius, limit)
+    return [dict(p, distance_m=dist) for dist, p in ranked]
+
+
+def _tile_key(tile: str) -> str:
+    return f"overpass:tile:{tile}"
+
+
+OVERPASS_CHUNK_SIZE = 64 * 1024
+# elements per tile query; large tiles in dense areas are cut off here and
+# the (incomplete) answer is not cached
+OVERPASS_MAX_ELEMENTS = 2000
+
+_overpass_mirrors: Optional[MirrorPool] = None
+
+
+def get_overpass_mirrors() -> MirrorPool:
+    """Return the hedging pool for the configured Overpass endpoints."""
+    global _overpass_mirrors
+    urls = get_overpass_endpoints()
+    if _overpass_mirrors is None or _overpass_mirrors.urls != urls:
+        _overpass_mirrors = MirrorPool(urls)
+    return _overpass_mirrors
+
+
+# identical concurrent searches and tile fetches share one upstream request
+_search_flights = Group()
+_tile_flights = Group()
+_google_flights = Group()
+
+
+def _fetch_overpass_tiles(tiles: List[str]) -> Tuple[Dict[str, List[Dict]], bool]:
+    """Fetch all cafes inside the given tiles with one Overpass query.
+
+    Returns the places by tile and whether the answer is complete. Only a
+    complete answer is cached (empty tiles included): Overpass reports a
+    timeout or memory error as a "remark" next to the elements it managed
+    to collect, and an answer cut off at OVERPASS_MAX_ELEMENTS may miss
+    places. Concurrent fetches of the same tile set are coalesced.
     """
-    OVERPASS_URL = "https://overpass-api.de/api/interpreter"
-    # query nodes and ways with amenity=cafe or shop=coffee
+    key = ",".join(sorted(tiles))
+    return _tile_flights.do(key, lambda: _query_overpass_tiles(tiles))
+
+
+def _query_overpass_tiles(tiles: List[str]) -> Tuple[Dict[str, List[Dict]], bool]:
+    precision = len(tiles[0])
+    south, west, north, east = union_bbox(tiles)
+    # query nodes and ways with amenity=cafe or shop=coffee inside the tiles
     q = f"""
-[out:json][timeout:25];
+[out:json][timeout:25][bbox:{south},{west},{north},{east}];
 (
-  node(around:{radius},{lat},{lng})[amenity=cafe];
-  node(around:{radius},{lat},{lng})[shop=coffee];
-  way(around:{radius},{lat},{lng})[amenity=cafe];
-  way(around:{radius},{lat},{lng})[shop=coffee];
+  node[amenity=cafe];
+  node[shop=coffee];
+  way[amenity=cafe];
+  way[shop=coffee];
 );
-out center {limit};
+out center {OVERPASS_MAX_ELEMENTS};
 """
-    # check cache first (respect configured TTL)
-    cache_key = f"overpass:{lat:.6f}:{lng:.6f}:{radius}"
-    cached = cache_get(cache_key, max_age_seconds=get_cache_ttl())
-    if cached:
-        return cached[:limit]
-
-    r = requests.post(OVERPASS_URL, data={"data": q.strip() }, timeout=30)
-    r.raise_for_status()
-    data = r.json()
-    results = []
-    for el in data.get("elements", []):
-        tags = el.get("tags", {})
-        name = tags.get("name") or tags.get("brand")
-        if not name:
-            continue
-        # node has lat/lon, way has center
-        if el.get("type") == "node":
-            el_lat = el.get("lat")
-            el_lon = el.get("lon")
-        else:
-            center = el.get("center") or {}
-            el_lat = center.get("lat")
-            el_lon = center.get("lon")
-        address_parts = []
-        for k in ("addr:housenumber","addr:street","addr:city","addr:postcode","addr:country"):
-            if tags.get(k):
-                address_parts.append(tags.get(k))
-        address = ", ".join(address_parts) if address_parts else tags.get("addr:full") or ""
-        dist = _distance_from(lat, lng, el_lat, el_lon) if el_lat and el_lon else None
-        results.append({
-            "name": name,
-            "lat": el_lat,
-            "lng": el_lon,
-            "address": address,
-            "distance_m": dist,
-            "rating": None,
-            "source": "overpass",
-        })
-    # sort by distance
-    results = [r for r in results if r.get("distance_m") is not None]
-    results.sort(key=lambda x: x["distance_m"])
-    # store in cache
+
+    def post(url):
+        r = net.post(url, data={"data": q.strip() }, stream=True)
+        try:
+            r.raise_for_status()
+        except Exception:
+            r.close()
+            raise
+        return r
+
+    # parse elements as they arrive instead of loading the whole response;
+    # only named places inside the requested tiles are kept
+    by_tile = {t: [] for t in tiles}
+    trailer = {}
+    count = 0
+    with span("overpass.request", tiles=len(tiles)):
+        r = get_overpass_mirrors().call(post)
     try:
-        cache_set(cache_key, results)
+        # download and decoding overlap, so this covers both
+        with span("overpass.parse"):
+            for el in iter_array_items(r.iter_content(OVERPASS_CHUNK_SIZE), "elements", trailer):
+                count += 1
+                place = _place_from_element(el)
+                if place is None:
+                    continue
+                bucket = by_tile.get(encode(place["lat"], place["lng"], precision))
+                if bucket is not None:
+                    bucket.append(place)
+    finally:
+        r.close()
+    complete = not trailer.get("remark") and count < OVERPASS_MAX_ELEMENTS
+    if complete:
+        for t, places in by_tile.items():
+            try:
+                cache_set(_tile_key(t), places)
+            except Exception:
+                pass
+    return by_tile, complete
+
+
+def search_overpass(lat: float, lng: float, radius: int = 1000, limit: int = 20) -> List[Dict]:
+    """Search Overpass API for cafes/coffee shops near the point.
+
+    Queries are snapped to geohash tiles: when every tile covering the
+    search disk is cached they are merged locally; otherwise one Overpass
+    query refreshes all tiles of the widened disk (see
+    refresh_overpass_area). Entries past the TTL but within the stale grace
+    period are returned at once and refreshed in the background.
+
+    Returns list of dicts: name, lat, lng, address, distance_m, source
+    """
+    with span("search_overpass"):
+        ttl = get_cache_ttl()
+        grace = get_cache_stale_grace()
+        stale_before = stale_reads()
+        # a cached search over a larger disk around this point already has everything
+        cached = cache_get_area("overpass", lat, lng, radius, max_age_seconds=ttl, stale_seconds=grace)
+        if cached is not None:
+            if stale_reads() > stale_before:
+                _revalidate_overpass(lat, lng, radius)
+            return _rank(cached, lat, lng, radius, limit)
+
+        precision = tile_precision(radius)
+        tiles = covering_tiles(lat, lng, radius, precision)
+        candidates = []
+        missing = []
+        # check cache first (respect configured TTL)
+        for t in tiles:
+            cached = cache_get(_tile_key(t), max_age_seconds=ttl, stale_seconds=grace)
+            if cached is None:
+                missing.append(t)
+            else:
+                candidates.extend(cached)
+        if missing:
+            candidates = refresh_overpass_area(lat, lng, radius)
+        elif stale_reads() > stale_before:
+            _revalidate_overpass(lat, lng, radius)
+        return _rank(candidates, lat, lng, radius, limit)
+
+
+def _revalidate_overpass(lat: float, lng: float, radius: int) -> None:
+    # searches centred in the same tile share one refresh
+    precision = tile_precision(radius)
+    key = f"overpass:refresh:{encode(lat, lng, precision)}:{_fetch_radius(radius)}"
+    schedule_refresh(key, lambda: refresh_overpass_area(lat, lng, radius))
+
+
+def refresh_overpass_area(lat: float, lng: float, radius: int = 1000) -> List[Dict]:
+    """Fetch and cache every tile around the point, plus the search disk.
+
+    One bbox query covers the whole (widened) disk anyway, so every tile in
+    it is refreshed and the disk is remembered for smaller searches.
+    Nothing is cached when Overpass' answer was incomplete. Returns the
+    unranked places of all fetched tiles.
+    """
+    fetch_radius = _fetch_radius(radius)
+    fetched, complete = _fetch_overpass_tiles(covering_tiles(lat, lng, fetch_radius, tile_precision(radius)))
+    candidates = [p for places in fetched.values() for p in places]
+    if not complete:
+        return candidates
+    try:
+        in_disk = [dict(p, distance_m=None) for p in _rank(candidates, lat, lng, fetch_radius)]
+        cache_set_area("overpass", lat, lng, fetch_radius, in_disk)
     except Exception:
         pass
-    return results[:limit]
+    return candidates
 
 
-def search_google_places(api_key: str, lat: float, lng: float, radius: int = 1000, limit: int = 20) -> List[Dict]:
-    """Search Google Places Nearby Search for coffee/cafe. Requires API key."""
-    URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+def search_local_index(lat: float, lng: float, radius: int = 1000, limit: int = 20) -> List[Dict]:
+    """Search the offline POI index (see `coffee-finder index build`)."""
+    candidates = local_index.query_bbox(*disk_bounds(lat, lng, radius))
+    return _rank(candidates, lat, lng, radius, limit)
+
+
+def _search_local(lat: float, lng: float, radius: int, limit: int) -> List[Dict]:
+    # the local index is optional; any problem with it means "not available"
+    if not local_index.has_index():
+        return []
+    try:
+        return search_local_index(lat, lng, radius=radius, limit=limit)
+    except Exception:
+        return []
+
+
+def iter_google_place_pages(api_key: str, lat: float, lng: float, radius: int = 1000) -> Iterator[List[Dict]]:
+    """Yield Google Places Nearby Search results one page (up to 20) at a time.
+
+    The next page is only requested when the caller asks for it, so
+    stopping iteration early skips the remaining round trips. Identical
+    page requests in flight at the same time (e.g. a search started twice)
+    share one upstream request.
+    """
+    URL = get_service_url("google_places")
     params = {
         "location": f"{lat},{lng}",
         "radius": radius,
@@ -88,47 +272,250 @@ def search_google_places(api_key: str, lat: float, lng: float, radius: int = 100
         "type": "cafe",
         "key": api_key,
     }
-    results = []
-    next_page = None
     while True:
-        resp = requests.get(URL, params=params, timeout=10)
-        resp.raise_for_status()
-        j = resp.json()
-        for p in j.get("results", []):
-            name = p.get("name")
-            loc = p.get("geometry", {}).get("location", {})
-            plat = loc.get("lat")
-            plng = loc.get("lng")
-            rating = p.get("rating")
-            vicinity = p.get("vicinity") or p.get("formatted_address")
-            dist = _distance_from(lat, lng, plat, plng) if plat and plng else None
-            results.append({
-                "name": name,
-                "lat": plat,
-                "lng": plng,
-                "address": vicinity,
-                "distance_m": dist,
-                "rating": rating,
-                "source": "google",
-            })
-            if len(results) >= limit:
-                return results[:limit]
+        key = f"{URL}?{sorted(params.items())}@{lat:.6f},{lng:.6f}"
+        page, next_page = _google_flights.do(key, lambda: _fetch_google_page(URL, params, lat, lng))
+        yield page
         # paging
-        next_page = j.get("next_page_token")
         if not next_page:
             break
         params = {"pagetoken": next_page, "key": api_key}
-    return results[:limit]
 
 
-def choose_provider(lat: float, lng: float, radius: int = 1000, limit: int = 20, min_rating: Optional[float] = None) -> List[Dict]:
-    api_key = os.environ.get("GOOGLE_PLACES_API_KEY") or get_google_api_key()
+def _fetch_google_page(url: str, params: Dict, lat: float, lng: float):
+    """Return one page of places (distances from lat, lng) and the next page token."""
+    with span("google.request"):
+        resp = net.get(url, params=params)
+        resp.raise_for_status()
+    with span("google.decode"):
+        j = resp.json()
+    page = []
+    for p in j.get("results", []):
+        name = p.get("name")
+        loc = p.get("geometry", {}).get("location", {})
+        plat = loc.get("lat")
+        plng = loc.get("lng")
+        rating = p.get("rating")
+        vicinity = p.get("vicinity") or p.get("formatted_address")
+        dist = _distance_from(lat, lng, plat, plng) if plat and plng else None
+        page.append({
+            "name": name,
+            "lat": plat,
+            "lng": plng,
+            "address": vicinity,
+            "distance_m": dist,
+            "rating": rating,
+            "source": "google",
+        })
+    return page, j.get("next_page_token")
+
+
+def iter_google_places(api_key: str, lat: float, lng: float, radius: int = 1000) -> Iterator[Dict]:
+    """Yield Google Places results one by one as their pages arrive."""
+    for page in iter_google_place_pages(api_key, lat, lng, radius=radius):
+        yield from page
+
+
+def search_google_places(api_key: str, lat: float, lng: float, radius: int = 1000, limit: int = 20) -> List[Dict]:
+    """Search Google Places Nearby Search for coffee/cafe. Requires API key."""
+    with span("search_google_places"):
+        return list(islice(iter_google_places(api_key, lat, lng, radius=radius), limit))
+
+
+# places from different providers closer than this may be the same cafe
+DEDUPE_DISTANCE_M = 60
+DEDUPE_NAME_SIMILARITY = 0.75
+
+_fanout_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _normalize_name(name: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", (name or "").casefold()).split())
+
+
+def _same_place(a: Dict, b: Dict) -> bool:
+    if None in (a.get("lat"), a.get("lng"), b.get("lat"), b.get("lng")):
+        return False
+    if haversine_distance(a["lat"], a["lng"], b["lat"], b["lng"]) > DEDUPE_DISTANCE_M:
+        return False
+    na, nb = _normalize_name(a.get("name")), _normalize_name(b.get("name"))
+    if not na or not nb:
+        return False
+    if na in nb or nb in na:
+        return True
+    return SequenceMatcher(None, na, nb).ratio() >= DEDUPE_NAME_SIMILARITY
+
+
+def merge_results(primary: List[Dict], secondary: List[Dict], limit: int) -> List[Dict]:
+    """Merge two providers' results, collapsing the same cafe into one entry.
+
+    `primary` wins on conflicts (Google: ratings); `secondary` fills in
+    missing fields and contributes the cafes `primary` doesn't know.
+    """
+    merged = [dict(p) for p in primary]
+    for p in secondary:
+        # each source merges into an entry at most once, even when it lists
+        # a cafe twice (OSM: as a node and a way)
+        match = next((m for m in merged if p["source"] not in m["source"].split("+") and _same_place(m, p)),
+                     None)
+        if match is None:
+            merged.append(dict(p))
+            continue
+        for k, v in p.items():
+            if match.get(k) in (None, "") and v not in (None, ""):
+                match[k] = v
+        match["source"] = f"{match['source']}+{p['source']}"
+    merged.sort(key=lambda x: x["distance_m"] if x.get("distance_m") is not None else float("inf"))
+    return merged[:limit]
+
+
+def _get_fanout_pool() -> ThreadPoolExecutor:
+    global _fanout_pool
+    if _fanout_pool is None:
+        _fanout_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="provider")
+    return _fanout_pool
+
+
+def _fanout(api_key: str, lat: float, lng: float, radius: int, limit: int, deadline: float) -> List[Dict]:
+    """Query Google and Overpass concurrently and merge what arrives in time.
+
+    If neither provider answers within `deadline` seconds, wait for the
+    first one rather than returning nothing.
+    """
+    pool = _get_fanout_pool()
+    google = pool.submit(bind_priority(search_google_places), api_key, lat, lng, radius=radius, limit=limit)
+    overpass = pool.submit(bind_priority(_search_overpass_stale), lat, lng, radius, limit)
+    done, pending = wait((google, overpass), timeout=deadline)
+    if not any(f.exception() is None for f in done):
+        # nothing usable by the deadline: take whichever succeeds next
+        for f in as_completed(pending):
+            if f.exception() is None:
+                break
+
+    def result(f):
+        if not f.done() or f.exception() is not None:
+            return []
+        return f.result() or []
+
+    overpass_places = []
+    if overpass.done() and overpass.exception() is None:
+        overpass_places, stale = overpass.result()
+        # report stale reads on the caller's thread, where the UI looks
+        for _ in range(stale):
+            _count_stale()
+    return merge_results(result(google), overpass_places, limit)
+
+
+def _search_overpass_stale(lat: float, lng: float, radius: int, limit: int):
+    """search_overpass for a worker thread: returns (places, stale reads)."""
+    before = stale_reads()
+    places = search_overpass(lat, lng, radius=radius, limit=limit)
+    return places, stale_reads() - before
+
+
+def filter_by_rating(places: List[Dict], min_rating: Optional[float]) -> List[Dict]:
+    """Keep places rated at least `min_rating` (all places if it is None).
+
+    Unrated places (e.g. from Overpass) are dropped when filtering.
+    """
+    if min_rating is None:
+        return places
+    return [p for p in places if (p.get("rating") is not None and p.get("rating") >= min_rating)]
+
+
+def choose_provider(lat: float, lng: float, radius: int = 1000, limit: int = 20, min_rating: Optional[float] = None,
+                    strategy: Optional[str] = None) -> List[Dict]:
+    """Search the configured providers.
+
+    `strategy` is "fallback" (Google, then Overpass if Google fails or
+    finds nothing), "fanout" (both at once, merged) or "local" (the offline
+    index built with `coffee-finder index build`, then "fallback" if it has
+    nothing nearby); defaults to config. The local index has no ratings, so
+    it is skipped when `min_rating` is given.
+
+    Concurrent calls for the same point (to ~1 m), radius, limit and
+    strategy share one search and get the same list, which must not be
+    mutated.
+    """
+    settings = get_provider_settings()
+    strategy = _effective_strategy(strategy or settings["strategy"], min_rating)
+    key = _search_key(lat, lng, radius, limit, strategy)
+    with span("choose_provider", strategy=strategy):
+        return _search_flights.do(key, lambda: _search(lat, lng, radius, limit, strategy, settings))
+
+
+def _effective_strategy(strategy: str, min_rating: Optional[float]) -> str:
+    # local places are unrated and would all be filtered out
+    if strategy == "local" and min_rating is not None:
+        return "fallback"
+    return strategy
+
+
+def _search_key(lat: float, lng: float, radius: int, limit: int, strategy: str) -> str:
+    return f"{lat:.5f}:{lng:.5f}:{radius}:{limit}:{strategy}"
+
+
+def _search(lat: float, lng: float, radius: int, limit: int, strategy: str, settings: Dict) -> List[Dict]:
+    return [p for page in _provider_pages(lat, lng, radius, limit, strategy, settings) for p in page]
+
+
+def _provider_pages(lat: float, lng: float, radius: int, limit: int, strategy: str,
+                    settings: Dict) -> Iterator[List[Dict]]:
+    """The provider order behind both choose_provider and iter_provider_pages.
+
+    Only Google's fallback path yields more than one page; together the
+    pages hold at most `limit` places.
+    """
+    if strategy == "local":
+        with span("local_index"):
+            local = _search_local(lat, lng, radius, limit)
+        if local:
+            yield local
+            return
+    api_key = get_google_api_key()
+    if api_key and strategy == "fanout":
+        yield _fanout(api_key, lat, lng, radius, limit, float(settings["deadline_seconds"]))
+        return
     if api_key:
-        try:
-            res = search_google_places(api_key, lat, lng, radius=radius, limit=limit)
-            if res:
-                return res
-        except Exception:
-            pass
-    # fallback to overpass
-    return search_overpass(lat, lng, radius=radius, limit=limit)
+        remaining = limit
+        pages = iter_google_place_pages(api_key, lat, lng, radius=radius)
+        while remaining > 0:
+            try:
+                page = next(pages, None)
+            except Exception:
+                # a failed first page falls back to Overpass below; after
+                # that, later pages are a bonus and we keep what we have
+                page = None
+            if not page:
+                break
+            yield page[:remaining]
+            remaining -= len(page)
+        if remaining < limit:
+            return
+    # Google is not configured, failed or found nothing
+    yield search_overpass(lat, lng, radius=radius, limit=limit)
+
+
+def iter_provider_pages(lat: float, lng: float, radius: int = 1000, limit: int = 20,
+                        min_rating: Optional[float] = None, strategy: Optional[str] = None) -> Iterator[List[Dict]]:
+    """Like choose_provider, but yield results page by page as they arrive.
+
+    Only Google's fallback path actually pages; fan-out, Overpass and local
+    results come as a single page. At most `limit` places are yielded. An
+    identical choose_provider call already in flight is waited for and
+    yielded as one page instead of searching again.
+    """
+    settings = get_provider_settings()
+    strategy = _effective_strategy(strategy or settings["strategy"], min_rating)
+    joined, places = _search_flights.join(_search_key(lat, lng, radius, limit, strategy))
+    if joined:
+        yield places
+        return
+    pages = _provider_pages(lat, lng, radius, limit, strategy, settings)
+    while True:
+        # span each page's fetch, not the caller's work between pages
+        with span("choose_provider", strategy=strategy, streamed=True):
+            page = next(pages, None)
+        if page is None:
+            return
+        yield page
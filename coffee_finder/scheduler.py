@@ -0,0 +1,229 @@
+"""Per-host request scheduling: rate limits, priorities and backoff.
+
+Every outgoing request takes a token from its host's bucket first, so
+Nominatim's 1 request/second policy and Overpass' slot limits hold no
+matter how many threads are searching. Interactive requests are served
+before background ones (prefetching, cache refreshes) waiting on the same
+host. A 429/503 answer pauses the whole host for its Retry-After time,
+or for an exponential backoff with jitter when the server gives none.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+INTERACTIVE = 0
+BACKGROUND = 1
+_PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+RETRY_STATUSES = (429, 503)
+
+T = TypeVar("T")
+
+_local = threading.local()
+
+
+def current_priority() -> int:
+    return getattr(_local, "priority", INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Run the enclosed requests (on this thread) at the given priority."""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def bind_priority(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap `fn` to run at the calling thread's current priority.
+
+    The priority is per thread, so work handed to a pool thread (hedged
+    mirror requests, provider fan-out) must carry it along explicitly.
+    """
+    level = current_priority()
+
+    def run(*args, **kwargs):
+        with priority(level):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+_periodic: Dict[str, threading.Thread] = {}
+_periodic_lock = threading.Lock()
+
+
+def run_periodically(name: str, fn: Callable[[], Any], interval_seconds: float) -> bool:
+    """Call fn() now and then every `interval_seconds` on a daemon thread.
+
+    Errors are ignored until the next round. A task is started once per
+    `name`; returns False if it is already running.
+    """
+    def loop():
+        while True:
+            try:
+                fn()
+            except Exception:
+                pass
+            time.sleep(interval_seconds)
+
+    with _periodic_lock:
+        running = _periodic.get(name)
+        if running is not None and running.is_alive():
+            return False
+        t = _periodic[name] = threading.Thread(target=loop, name=name, daemon=True)
+    t.start()
+    return True
+
+
+class HostBucket:
+    """Token bucket for one host, with a cooldown set by throttling answers.
+
+    `rate` is requests per second; None means no limit (only cooldowns
+    apply). Waiters of a higher priority always go first.
+    """
+
+    def __init__(self, rate: Optional[float], burst: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting = [0 for _ in _PRIORITIES]
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _delay(self, level: int, now: float) -> Optional[float]:
+        """Seconds until `level` may go, 0 if it may go now, None if a
+        higher-priority waiter is ahead."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if any(self.waiting[p] for p in range(level)):
+            return None
+        if self.rate and self.tokens < 1.0:
+            return (1.0 - self.tokens) / self.rate
+        return 0.0
+
+    def acquire(self, level: int = INTERACTIVE) -> float:
+        """Block until a request may be sent; return the time waited."""
+        started = time.monotonic()
+        with self._cond:
+            self.waiting[level] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self._delay(level, now)
+                    if delay == 0.0:
+                        if self.rate:
+                            self.tokens -= 1.0
+                        return now - started
+                    # woken early when a waiter ahead of us leaves
+                    self._cond.wait(delay if delay is not None else 0.1)
+            finally:
+                self.waiting[level] -= 1
+                self._cond.notify_all()
+
+    def block(self, seconds: float) -> None:
+        """Hold every request to this host for `seconds`."""
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class Scheduler:
+    """Buckets for every host seen, created from the configured rates."""
+
+    def __init__(self, rates: Dict[str, float], backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.rates = dict(rates)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+        self._buckets: Dict[str, HostBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> HostBucket:
+        with self._lock:
+            b = self._buckets.get(host)
+            if b is None:
+                b = self._buckets[host] = HostBucket(self.rates.get(host))
+            return b
+
+    def acquire(self, host: str, level: Optional[int] = None) -> None:
+        waited = self.bucket(host).acquire(current_priority() if level is None else level)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["wait_seconds"] += waited
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def throttled(self, host: str, attempt: int, retry_after: Optional[str]) -> float:
+        """Record a 429/503 from `host`; pause the host and return the delay."""
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff(attempt)
+        self.bucket(host).block(delay)
+        with self._lock:
+            self.stats["throttled"] += 1
+        return delay
+
+    def retried(self) -> None:
+        with self._lock:
+            self.stats["retries"] += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.stats)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or an HTTP date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Return the process-wide scheduler, built from the HTTP settings."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from .config import get_http_settings
+            settings = get_http_settings()
+            _scheduler = Scheduler(
+                {h: float(r) for h, r in (settings.get("rate_limits") or {}).items()},
+                backoff_base=float(settings.get("backoff_base", 0.5)),
+                backoff_max=float(settings.get("backoff_max", 30.0)),
+            )
+        return _scheduler
+
+
+def reset_scheduler() -> None:
+    """Forget all buckets; the next request rereads the configured rates."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
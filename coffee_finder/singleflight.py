@@ -0,0 +1,69 @@
+"""Coalescing of identical concurrent calls ("single flight").
+
+While a call for a key is running, other callers with the same key wait
+for it and get the same result (or exception) instead of repeating the
+upstream request.
+"""
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class Group:
+    """A namespace of in-flight calls; `stats` counts calls and shared ones.
+
+    Results are handed to every waiter as is and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self.stats = {"calls": 0, "shared": 0}
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn() unless a call for `key` is in flight; then wait for it."""
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def join(self, key: str) -> Tuple[bool, Any]:
+        """Wait for an in-flight call for `key` without starting one.
+
+        Returns (True, its result), or (False, None) if none is running.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                return False, None
+            self.stats["calls"] += 1
+            self.stats["shared"] += 1
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return True, call.result
@@ -0,0 +1,145 @@
+"""Geohash tiles used to quantize spatial queries for caching."""
+import math
+from typing import List, Tuple
+
+from .utils import _EARTH_RADIUS_M
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+# metres per degree of latitude (and of longitude at the equator) on the
+# sphere haversine_distance uses; a larger value would make the bounds
+# below too small and drop places on the rim of a disk
+_M_PER_DEG = _EARTH_RADIUS_M * math.pi / 180.0
+
+
+def encode(lat: float, lng: float, precision: int = 6) -> str:
+    """Return the geohash of a point at the given precision."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch = ch << 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch = ch << 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(chars)
+
+
+def bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (south, west, north, east) bounds of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    even = True
+    for c in geohash:
+        v = _DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = (v >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                if bit:
+                    lng_lo = mid
+                else:
+                    lng_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lng_lo, lat_hi, lng_hi
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Return (height, width) in degrees of a cell at the given precision."""
+    nbits = 5 * precision
+    lng_bits = (nbits + 1) // 2
+    lat_bits = nbits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def tile_precision(radius: float) -> int:
+    """Pick a tile precision so a query disk is covered by a handful of tiles."""
+    if radius <= 3000:
+        return 6  # ~0.6 x 1.2 km
+    if radius <= 15000:
+        return 5  # ~4.9 x 4.9 km
+    return 4
+
+
+def disk_bounds(lat: float, lng: float, radius: float) -> Tuple[float, float, float, float]:
+    """Return a (south, west, north, east) box enclosing the disk."""
+    dlat = radius / _M_PER_DEG
+    # widest longitude span of a spherical cap, slightly more than
+    # radius / (m per degree * cos(lat))
+    angular = radius / _EARTH_RADIUS_M
+    coslat = math.cos(math.radians(lat))
+    if coslat <= math.sin(angular):
+        dlng = 180.0  # the disk reaches over a pole
+    else:
+        dlng = min(math.degrees(math.asin(math.sin(angular) / coslat)), 180.0)
+    return max(lat - dlat, -90.0), lng - dlng, min(lat + dlat, 90.0), lng + dlng
+
+
+def covering_tiles(lat: float, lng: float, radius: float, precision: int = 6) -> List[str]:
+    """Return geohashes of all cells at `precision` that intersect the disk."""
+    south, west, north, east = disk_bounds(lat, lng, radius)
+    h, w = cell_size(precision)
+    coslat = max(math.cos(math.radians(lat)), 1e-6)
+    tiles = []
+    seen = set()
+    row = math.floor((south + 90.0) / h)
+    while row * h - 90.0 < north:
+        cell_s = row * h - 90.0
+        col = math.floor((west + 180.0) / w)
+        while col * w - 180.0 < east:
+            cell_w = col * w - 180.0
+            # nearest point of the cell to the centre, in local metres
+            near_lat = min(max(lat, cell_s), cell_s + h)
+            near_lng = min(max(lng, cell_w), cell_w + w)
+            dy = (near_lat - lat) * _M_PER_DEG
+            # the more poleward latitude keeps this from overestimating the distance
+            dx = (near_lng - lng) * _M_PER_DEG * min(coslat, math.cos(math.radians(near_lat)))
+            if dx * dx + dy * dy <= radius * radius:
+                c_lat = min(cell_s + h / 2, 90.0)
+                c_lng = (cell_w + w / 2 + 180.0) % 360.0 - 180.0
+                gh = encode(c_lat, c_lng, precision)
+                if gh not in seen:
+                    seen.add(gh)
+                    tiles.append(gh)
+            col += 1
+        row += 1
+    return tiles
+
+
+def union_bbox(geohashes: List[str]) -> Tuple[float, float, float, float]:
+    """Return the (south, west, north, east) box enclosing all given cells."""
+    boxes = [bbox(g) for g in geohashes]
+    return (
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
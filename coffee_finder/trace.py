@@ -0,0 +1,152 @@
+"""Lightweight timing spans for the search pipeline.
+
+    with trace.span("geocode"):
+        ...
+
+Tracing is off by default and span() then returns a shared no-op
+context manager, so instrumented code pays one function call. When
+enabled, every finished span is aggregated per call path (for the
+--profile breakdown) and handed to the registered exporters, e.g. one
+that writes JSON lines.
+"""
+import json
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
+
+_NOOP = nullcontext()
+
+_enabled = False
+_exporters: List[Callable[[Dict[str, Any]], None]] = []
+_local = threading.local()
+_lock = threading.Lock()
+# call path -> [count, total seconds, max seconds]
+_totals: Dict[Tuple[str, ...], List[float]] = {}
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "path", "started", "wall")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> "_Span":
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = (stack[-1].path if stack else ()) + (self.name,)
+        stack.append(self)
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        duration = time.perf_counter() - self.started
+        _local.stack.pop()
+        with _lock:
+            entry = _totals.get(self.path)
+            if entry is None:
+                _totals[self.path] = [1, duration, duration]
+            else:
+                entry[0] += 1
+                entry[1] += duration
+                entry[2] = max(entry[2], duration)
+            exporters = list(_exporters)
+        if exporters:
+            record = {
+                "name": self.name,
+                "path": "/".join(self.path),
+                "start": self.wall,
+                "duration_ms": round(duration * 1000, 3),
+                "thread": threading.current_thread().name,
+            }
+            if self.attrs:
+                record["attrs"] = self.attrs
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            for export in exporters:
+                try:
+                    export(record)
+                except Exception:
+                    pass
+
+
+def span(name: str, **attrs: Any):
+    """Time the enclosed block as stage `name` (nested under any open span)."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(exporter: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+    """Start recording spans, optionally adding an exporter."""
+    global _enabled
+    if exporter is not None:
+        add_exporter(exporter)
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def add_exporter(exporter: Callable[[Dict[str, Any]], None]) -> None:
+    """Call `exporter(record)` with a dict for every finished span."""
+    with _lock:
+        _exporters.append(exporter)
+
+
+def reset() -> None:
+    """Forget aggregated timings and exporters."""
+    with _lock:
+        _totals.clear()
+        _exporters.clear()
+
+
+def jsonl_exporter(stream: TextIO) -> Callable[[Dict[str, Any]], None]:
+    """Return an exporter writing one JSON object per span to `stream`."""
+    lock = threading.Lock()
+
+    def export(record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str)
+        with lock:
+            stream.write(line + "\n")
+            stream.flush()
+
+    return export
+
+
+def summary() -> List[Dict[str, Any]]:
+    """Return aggregated timings per call path, parents before children."""
+    with _lock:
+        items = sorted(_totals.items())
+    return [{
+        "path": "/".join(path),
+        "name": path[-1],
+        "depth": len(path) - 1,
+        "count": int(count),
+        "total_ms": round(total * 1000, 3),
+        "mean_ms": round(total / count * 1000, 3),
+        "max_ms": round(peak * 1000, 3),
+    } for path, (count, total, peak) in items]
+
+
+def format_summary() -> str:
+    """Render summary() as an indented per-stage table."""
+    rows = summary()
+    if not rows:
+        return "No spans recorded."
+    width = max(len("  " * r["depth"] + r["name"]) for r in rows)
+    lines = [f"{'stage':<{width}}  {'calls':>5}  {'total ms':>10}  {'mean ms':>9}  {'max ms':>9}"]
+    for r in rows:
+        label = "  " * r["depth"] + r["name"]
+        lines.append(f"{label:<{width}}  {r['count']:>5}  {r['total_ms']:>10.1f}  "
+                     f"{r['mean_ms']:>9.1f}  {r['max_ms']:>9.1f}")
+    return "\n".join(lines)
@@ -10,9 +10,10 @@ import pystray
 from PIL import Image, ImageDraw
 import os
 
-from .gui import CoffeeFinderGUI
-from .config import get_cache_ttl, get_google_api_key, set_cache_ttl, set_google_api_key
+from .config import get_cache_ttl, get_saved_google_api_key, set_cache_ttl, set_google_api_key
 from .login import show_login
+from .cache import start_sweeper
+from .prefetch import start_prefetcher
 
 
 def _make_image():
@@ -35,6 +36,8 @@ class TrayApp:
 
     def _open_gui(self, icon=None, item=None):
         if self.gui_window is None or not tk.Toplevel.winfo_exists(self.gui_window):
+            # the GUI (and the search stack behind it) loads on first open
+            from .gui import CoffeeFinderGUI
             self.gui_window = tk.Toplevel(self.root)
             CoffeeFinderGUI(self.gui_window, self.username)
         else:
@@ -63,7 +66,10 @@ class TrayApp:
         ttk.Entry(dlg, textvariable=ttl).grid(row=0, column=1, padx=6, pady=6)
 
         ttk.Label(dlg, text="Google Places API Key").grid(row=1, column=0, padx=6, pady=6)
-        api = tk.StringVar(value=get_google_api_key() or os.environ.get("GOOGLE_PLACES_API_KEY") or "")
+        # the file's key, not an environment override, which must not be
+        # written to the file just because the dialog was saved
+        saved_key = get_saved_google_api_key() or ""
+        api = tk.StringVar(value=saved_key)
         ttk.Entry(dlg, textvariable=api, width=40).grid(row=1, column=1, padx=6, pady=6)
 
         def on_save():
@@ -75,11 +81,13 @@ class TrayApp:
                 return
             set_cache_ttl(int(max(0, hours * 3600)))
             key = api.get().strip() or None
-            set_google_api_key(key)
-            if key:
-                os.environ["GOOGLE_PLACES_API_KEY"] = key
-            else:
-                os.environ.pop("GOOGLE_PLACES_API_KEY", None)
+            if key != (saved_key or None):
+                set_google_api_key(key)
+                # the new key also wins over the environment in this process
+                if key:
+                    os.environ["GOOGLE_PLACES_API_KEY"] = key
+                else:
+                    os.environ.pop("GOOGLE_PLACES_API_KEY", None)
             import tkinter.messagebox as messagebox
             messagebox.showinfo("Saved", "Settings saved")
             dlg.destroy()
@@ -146,6 +154,10 @@ class TrayApp:
             self.root = tk.Tk()
         # hide the root: we use Toplevel windows to display GUI on demand
         self.root.withdraw()
+        # long-running process: keep the query cache within its size budget
+        start_sweeper()
+        # refresh results around saved locations before they expire
+        start_prefetcher()
 
         menu = pystray.Menu(
             pystray.MenuItem("Open", self._open_gui),
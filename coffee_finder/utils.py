@@ -1,6 +1,14 @@
+import heapq
 import math
-from typing import Tuple
-import requests
+from typing import List, Sequence, Tuple
+
+# NumPy is optional (pure-Python fallbacks are used without it) and slow to
+# import, so it is only loaded once an input is large enough to benefit
+_UNLOADED = object()
+np = _UNLOADED
+_NUMPY_MIN_ITEMS = 256
+
+_EARTH_RADIUS_M = 6371000.0
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -24,3 +32,66 @@ def parse_latlng(value: str) -> Tuple[float, float]:
     return float(parts[0]), float(parts[1])
 
 
+
+
+def _numpy(n: int):
+    """Return the numpy module if it is worth using for `n` items, else None."""
+    global np
+    if n < _NUMPY_MIN_ITEMS or n == 0:
+        return None
+    if np is _UNLOADED:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+def haversine_many(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> List[float]:
+    """Return distances in meters from (lat, lon) to every (lats[i], lons[i]).
+
+    Uses NumPy for large inputs when it is installed, computing all
+    distances in one pass.
+    """
+    np = _numpy(len(lats))
+    if np is not None:
+        phi1 = np.radians(lat)
+        phi2 = np.radians(np.asarray(lats, dtype=float))
+        dphi = phi2 - phi1
+        dlambda = np.radians(np.asarray(lons, dtype=float) - lon)
+        a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+        return (2 * _EARTH_RADIUS_M * np.arctan2(np.sqrt(a), np.sqrt(1 - a))).tolist()
+    phi1 = math.radians(lat)
+    cos1 = math.cos(phi1)
+    out = []
+    for lat2, lon2 in zip(lats, lons):
+        phi2 = math.radians(lat2)
+        a = math.sin((phi2 - phi1) / 2) ** 2 + cos1 * math.cos(phi2) * math.sin(math.radians(lon2 - lon) / 2) ** 2
+        out.append(2 * _EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
+    return out
+
+
+def top_k_indices(values: Sequence[float], k: int) -> List[int]:
+    """Return indices of the k smallest values, smallest first, in O(n log k)."""
+    n = len(values)
+    if k <= 0 or n == 0:
+        return []
+    if k >= n:
+        return sorted(range(n), key=values.__getitem__)
+    np = _numpy(n)
+    if np is not None:
+        arr = np.asarray(values, dtype=float)
+        part = np.argpartition(arr, k - 1)[:k]
+        return part[np.argsort(arr[part], kind="stable")].tolist()
+    return heapq.nsmallest(k, range(n), key=values.__getitem__)
+
+
+def nearest(lat: float, lon: float, places: Sequence[dict], radius: float, k: int = None) -> List[Tuple[float, dict]]:
+    """Return (distance, place) for places within `radius` meters, nearest
+    first; at most `k` of them if given. Places need "lat" and "lng" keys."""
+    distances = haversine_many(lat, lon, [p["lat"] for p in places], [p["lng"] for p in places])
+    in_range = [i for i, d in enumerate(distances) if d <= radius]
+    dists = [distances[i] for i in in_range]
+    order = top_k_indices(dists, len(dists) if k is None else k)
+    return [(dists[j], places[in_range[j]]) for j in order]
@@ -25,3 +25,187 @@ def test_cache_expiry(monkeypatch):
     monkeypatch.setattr(cache.time, "time", fake_time)
     got = cache.cache_get(key, max_age_seconds=60)
     assert got is None
+
+
+def test_cache_area_superset():
+    ns = f"test-area-{time.time()}"
+    cache.cache_set_area(ns, 40.0, -74.0, 2000, [{"name": "A"}])
+    # smaller disk inside the cached one is served
+    assert cache.cache_get_area(ns, 40.001, -74.001, 1000) == [{"name": "A"}]
+    # larger disk, or one poking outside, is not
+    assert cache.cache_get_area(ns, 40.0, -74.0, 3000) is None
+    assert cache.cache_get_area(ns, 40.015, -74.0, 1000) is None
+    # a disk just inside the cached one, due north, is not dropped by the prefilter
+    assert cache.cache_get_area(ns, 40.0 + 999.5 / 111194.93, -74.0, 1000) == [{"name": "A"}]
+
+
+def test_backend_parallel_writers(tmp_path):
+    import threading
+
+    backend = cache.CacheBackend(str(tmp_path / "cache.db"))
+
+    def writer(n):
+        for i in range(50):
+            assert backend.set(f"k:{n}:{i}", str(i), int(time.time()), 3600)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert backend.get("k:3:49")[0] == "49"
+    assert backend.stats["writes"] == 200
+    assert backend.stats["locked"] == 0
+    backend.close()
+
+
+def test_backend_closes_connections_of_finished_threads(tmp_path):
+    import gc
+    import threading
+
+    backend = cache.CacheBackend(str(tmp_path / "cache.db"))
+    backend.set("k", "v", int(time.time()), 3600)
+    for _ in range(50):
+        t = threading.Thread(target=backend.get, args=("k",))
+        t.start()
+        t.join()
+    gc.collect()
+    # only this thread's connection is left
+    assert backend.open_connections() == 1
+    assert backend.get("k")[0] == "v"
+    backend.close()
+    assert backend.open_connections() == 0
+
+
+def test_backend_sweep_expires_and_evicts(tmp_path):
+    backend = cache.CacheBackend(str(tmp_path / "cache.db"))
+    now = int(time.time())
+    backend.set("old", "x" * 10, now - 7200, 3600)
+    for i in range(10):
+        backend.set(f"k{i}", "y" * 100, now - 100 + i, 3600)
+    result = backend.sweep(max_rows=5, max_bytes=10 ** 6)
+    assert result["expired"] == 1
+    assert backend.get("old") is None
+    # least recently used rows go first, down to 90% of the budget
+    assert result["evicted"] == 6
+    assert backend.get("k0") is None
+    assert backend.get("k9") is not None
+    backend.close()
+
+
+def test_backend_auto_vacuum(tmp_path):
+    import sqlite3
+
+    # new files get incremental auto_vacuum from the start
+    backend = cache.CacheBackend(str(tmp_path / "new.db"))
+    backend.set("k", "v", int(time.time()), 3600)
+    assert backend._conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    backend.close()
+
+    # old files are only converted when the background sweeper asks
+    path = str(tmp_path / "old.db")
+    sqlite3.connect(path).execute("CREATE TABLE t (a)").connection.close()
+    backend = cache.CacheBackend(path)
+    backend.sweep(max_rows=10, max_bytes=10 ** 6)
+    assert backend._conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    backend.sweep(max_rows=10, max_bytes=10 ** 6, convert=True)
+    assert backend._conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    backend.close()
+
+
+def test_memory_cache_lru_and_ttl(monkeypatch):
+    mem = cache.MemoryCache(max_entries=2, max_bytes=100)
+    now = int(time.time())
+    mem.put("a", 1, now, 10, 3600)
+    mem.put("b", 2, now, 10, 3600)
+    assert mem.get("a", 60) == 1
+    mem.put("c", 3, now, 10, 3600)
+    # "b" was least recently used
+    assert mem.get("b", 60) is None
+    assert mem.get("c", 60) == 3
+    # oversized values are not kept
+    mem.put("big", 4, now, 1000, 3600)
+    assert mem.get("big", 60) is None
+    monkeypatch.setattr(cache.time, "time", lambda: now + 120)
+    assert mem.get("a", 60) is None
+    assert mem.stats["hits"] == 2
+
+
+def test_cache_get_reads_through_memory(monkeypatch):
+    key = f"test:memory:{time.time()}"
+    cache.cache_set(key, [1, 2])
+    monkeypatch.setattr(cache, "decode", lambda s: (_ for _ in ()).throw(AssertionError("decoded")))
+    assert cache.cache_get(key) == [1, 2]
+
+
+def test_memory_cache_charges_decoded_size(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "_DB_PATH", str(tmp_path / "size.db"))
+    monkeypatch.setattr(cache, "_memory", cache.MemoryCache())
+    cache._get_backend()  # switching databases clears the memory layer
+    places = [{"name": f"Cafe {i}", "lat": 40.0 + i * 1e-4, "lng": -74.0, "address": "Main St",
+               "distance_m": None, "rating": None, "source": "overpass"} for i in range(200)]
+    cache.cache_set("places", places)
+    # charged for the decoded places, not the much smaller compressed row
+    assert cache._memory._bytes >= 200 * cache._PLACE_BYTES > 10 * len(cache.encode(places))
+
+
+def test_backend_reads_legacy_json_rows(tmp_path, monkeypatch):
+    import json
+    import sqlite3
+
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cache (k TEXT PRIMARY KEY, v TEXT, ts INTEGER)")
+    conn.execute("INSERT INTO cache VALUES (?, ?, ?)", ("old", json.dumps({"a": 1}), int(time.time())))
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(cache, "_DB_PATH", path)
+    assert cache.cache_get("old") == {"a": 1}
+
+
+def test_cache_get_serves_stale_within_grace(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "_DB_PATH", str(tmp_path / "stale.db"))
+    cache.cache_set("stale:key", {"v": 1}, ttl=60)
+    real_time = time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: real_time + 120)
+    before = cache.stale_reads()
+    assert cache.cache_get("stale:key", max_age_seconds=60) is None
+    assert cache.cache_get("stale:key", max_age_seconds=60, stale_seconds=3600) == {"v": 1}
+    assert cache.stale_reads() == before + 1
+    assert cache.cache_get("stale:key", max_age_seconds=3600) == {"v": 1}
+    assert cache.stale_reads() == before + 1
+
+
+def test_cache_get_area_sees_refreshed_area(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "_DB_PATH", str(tmp_path / "area.db"))
+    cache.cache_set_area("ns", 40.0, -74.0, 2000, ["old"], ttl=60)
+    # remembered in memory while fresh
+    assert cache.cache_get_area("ns", 40.0, -74.0, 1000, max_age_seconds=60) == ["old"]
+
+    real_time = time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: real_time + 120)
+    before = cache.stale_reads()
+    assert cache.cache_get_area("ns", 40.0, -74.0, 1000, max_age_seconds=60, stale_seconds=3600) == ["old"]
+    assert cache.stale_reads() == before + 1
+
+    # the background refresh rewrites the area; the next lookup is fresh
+    cache.cache_set_area("ns", 40.0, -74.0, 2000, ["new"], ttl=60)
+    assert cache.cache_get_area("ns", 40.0, -74.0, 1000, max_age_seconds=60, stale_seconds=3600) == ["new"]
+    assert cache.stale_reads() == before + 1
+
+
+def test_schedule_refresh_runs_once_per_key():
+    import threading
+
+    release = threading.Event()
+    runs = []
+
+    def refresh():
+        runs.append(1)
+        release.wait(5)
+
+    assert cache.schedule_refresh("refresh:key", refresh)
+    assert not cache.schedule_refresh("refresh:key", refresh)
+    release.set()
+    assert cache.wait_for_refreshes(5)
+    assert runs == [1]
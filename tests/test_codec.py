@@ -0,0 +1,28 @@
+import json
+
+from coffee_finder import codec
+
+
+def _places(n):
+    return [{"name": f"Cafe {i % 7}", "lat": 40.0 + i * 1e-4, "lng": -74.0, "address": "" if i % 2 else None,
+             "distance_m": None if i == 0 else float(i), "rating": 4.5 if i % 3 else None,
+             "source": "overpass"} for i in range(n)]
+
+
+def test_places_roundtrip_is_compact():
+    places = _places(200)
+    blob = codec.encode(places)
+    assert blob[0] == codec.PLACES_CODEC.codec_id
+    assert codec.decode(blob) == places
+    assert len(blob) < len(json.dumps(places)) / 3
+
+
+def test_other_values_fall_back_to_json():
+    for value in ({"a": [1, 2]}, [], [{"name": "x"}], "text", 3):
+        blob = codec.encode(value)
+        assert blob[0] == codec.JSON_CODEC.codec_id
+        assert codec.decode(blob) == value
+
+
+def test_legacy_text_rows_decode():
+    assert codec.decode(json.dumps([1, 2])) == [1, 2]
@@ -29,3 +29,70 @@ def test_config_read_write(monkeypatch):
         # cleanup
         if os.path.exists(test_path):
             os.remove(test_path)
+
+
+def test_service_urls_default_and_override(monkeypatch, tmp_path):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(config, "_PATH", str(path))
+    assert config.get_service_url("nominatim") == "https://nominatim.openstreetmap.org/search"
+    path.write_text(json.dumps({"ipinfo_url": "http://127.0.0.1:8000/json"}))
+    config.reload_config()
+    assert config.get_service_url("ipinfo") == "http://127.0.0.1:8000/json"
+
+
+def test_config_cached_and_revalidated(monkeypatch, tmp_path):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(config, "_PATH", str(path))
+    config.write_config({"cache_ttl_seconds": 60})
+    assert config.get_cache_ttl() == 60
+
+    # served from memory: no file access between checks
+    def no_open(*args, **kwargs):
+        raise AssertionError("config.json re-read")
+    monkeypatch.setattr(config, "open", no_open, raising=False)
+    for _ in range(100):
+        assert config.get_cache_ttl() == 60
+    monkeypatch.delattr(config, "open")
+
+    # an outside edit is picked up at the next check
+    path.write_text(json.dumps({"cache_ttl_seconds": 120}))
+    monkeypatch.setattr(config._current(), "check_interval", 0)
+    assert config.get_cache_ttl() == 120
+
+
+def test_env_overrides_config_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "_PATH", str(tmp_path / "config.json"))
+    config.set_google_api_key("file-key")
+    monkeypatch.setenv("GOOGLE_PLACES_API_KEY", "env-key")
+    assert config.get_google_api_key() == "env-key"
+    assert config.read_config()["google_places_api_key"] == "env-key"
+
+    # saving other settings does not persist the override
+    config.set_cache_ttl(10)
+    monkeypatch.delenv("GOOGLE_PLACES_API_KEY")
+    assert config.get_google_api_key() == "file-key"
+
+
+def test_write_is_atomic(monkeypatch, tmp_path):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(config, "_PATH", str(path))
+    config.set_cache_ttl(3600)
+
+    def failing_dump(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(config.json, "dump", failing_dump)
+    config.set_cache_ttl(60)
+    monkeypatch.undo()
+
+    # the old file survives intact and no temporary file is left behind
+    assert json.loads(path.read_text())["cache_ttl_seconds"] == 3600
+    assert os.listdir(tmp_path) == ["config.json"]
+
+
+def test_saved_key_ignores_env_override(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "_PATH", str(tmp_path / "config.json"))
+    monkeypatch.setenv("GOOGLE_PLACES_API_KEY", "env-key")
+    assert config.get_saved_google_api_key() is None
+    config.set_google_api_key("file-key")
+    assert config.get_saved_google_api_key() == "file-key"
+    assert config.get_google_api_key() == "env-key"
@@ -126,3 +126,56 @@ def test_preferences(monkeypatch):
     finally:
         if os.path.exists(db_path):
             os.remove(db_path)
+
+
+def test_saved_places_near(monkeypatch):
+    """Test nearest-neighbor queries over saved places."""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as f:
+        db_path = f.name
+    
+    monkeypatch.setattr(database, '_DB_PATH', db_path)
+    database._init_db()
+    
+    try:
+        database.save_place("Near", 40.7130, -74.0060, "testuser")
+        database.save_place("Nearer", 40.7129, -74.0060, "testuser")
+        database.save_place("Far", 40.8000, -74.0060, "testuser")
+        database.save_place("Other User", 40.7128, -74.0060, "otheruser")
+        
+        places = database.get_saved_places_near("testuser", 40.7128, -74.0060, radius=500, k=5)
+        assert [p['name'] for p in places] == ["Nearer", "Near"]
+        assert places[0]['distance_m'] < places[1]['distance_m']
+        
+        # k limits the result
+        places = database.get_saved_places_near("testuser", 40.7128, -74.0060, radius=50000, k=1)
+        assert [p['name'] for p in places] == ["Nearer"]
+        
+        # deleted places leave the index
+        database.delete_saved_place(places[0]['id'], "testuser")
+        places = database.get_saved_places_near("testuser", 40.7128, -74.0060, radius=500, k=5)
+        assert [p['name'] for p in places] == ["Near"]
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+
+def test_saved_places_near_includes_rim(monkeypatch, tmp_path):
+    """Places just inside the radius are not cut off by the bounding box."""
+    monkeypatch.setattr(database, '_DB_PATH', str(tmp_path / 'user.db'))
+    database.save_place("North rim", 40.0 + 999.5 / 111194.93, -74.0, "testuser")
+    database.save_place("East rim", 40.0, -74.0 + 999.5 / (111194.93 * 0.766044), "testuser")
+    places = database.get_saved_places_near("testuser", 40.0, -74.0, radius=1000, k=5)
+    assert sorted(p['name'] for p in places) == ["East rim", "North rim"]
+
+
+def test_schema_created_on_first_use(monkeypatch):
+    """The database file and its directory appear only when first used."""
+    with tempfile.TemporaryDirectory() as d:
+        db_path = os.path.join(d, 'nested', 'user.db')
+        monkeypatch.setattr(database, '_DB_PATH', db_path)
+        assert not os.path.exists(db_path)
+
+        assert database.get_home_location("testuser") is None
+        assert os.path.exists(db_path)
+        database.set_home_location(40.7128, -74.0060, "testuser")
+        assert database.get_home_location("testuser")['lat'] == 40.7128
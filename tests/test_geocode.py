@@ -0,0 +1,57 @@
+import pytest
+
+from coffee_finder import geocode
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+def _fake_cache(monkeypatch):
+    store = {}
+    monkeypatch.setattr(geocode, "cache_get", lambda k, max_age_seconds=0: store.get(k))
+    monkeypatch.setattr(geocode, "cache_set", lambda k, v, ttl=None: store.__setitem__(k, v))
+    return store
+
+
+def test_normalize_address():
+    assert geocode.normalize_address("  1600 Amphitheatre Pkwy,  Mountain View ") == \
+        geocode.normalize_address("1600 amphitheatre pkwy mountain view")
+    assert geocode.normalize_address("Café de Flore, PARIS") == "cafe de flore paris"
+    assert geocode.normalize_address("Straße ８") == geocode.normalize_address("strasse 8")
+
+
+def test_geocode_is_cached_by_normalized_address(monkeypatch):
+    _fake_cache(monkeypatch)
+    calls = []
+
+    def fake_get(url, params=None):
+        calls.append(params["q"])
+        return FakeResponse([{"lat": "37.42", "lon": "-122.08"}])
+
+    monkeypatch.setattr(geocode.net, "get", fake_get)
+    assert geocode.geocode("1600 Amphitheatre Pkwy, Mountain View") == (37.42, -122.08)
+    assert geocode.geocode("1600 amphitheatre pkwy  mountain view") == (37.42, -122.08)
+    assert len(calls) == 1
+
+
+def test_geocode_caches_misses(monkeypatch):
+    _fake_cache(monkeypatch)
+    calls = []
+
+    def fake_get(url, params=None):
+        calls.append(params["q"])
+        return FakeResponse([])
+
+    monkeypatch.setattr(geocode.net, "get", fake_get)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            geocode.geocode("nowhere at all")
+    assert len(calls) == 1
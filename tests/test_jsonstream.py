@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from coffee_finder.jsonstream import iter_array_items
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_items_across_chunk_boundaries():
+    doc = {"osm3s": {"note": "café"}, "elements": [{"id": i, "tags": {"name": f"Café {i}"}} for i in range(50)]}
+    data = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+    for size in (1, 3, 64, len(data)):
+        assert list(iter_array_items(_chunks(data, size), "elements")) == doc["elements"]
+
+
+def test_numbers_split_across_chunks():
+    assert list(iter_array_items([b'{"elements": [12', b'34, 5]}'], "elements")) == [1234, 5]
+
+
+def test_missing_key_and_truncation():
+    assert list(iter_array_items([b'{"other": [1]}'], "elements")) == []
+    with pytest.raises(ValueError):
+        list(iter_array_items([b'{"elements": [{"id": 1}, {"id"'], "elements"))
+
+
+def test_trailing_fields_after_array():
+    data = b'{"version": 0.6, "elements": [{"id": 1}],\n"remark": "runtime error: Query timed out"\n}'
+    trailer = {}
+    for size in (1, 7, len(data)):
+        trailer.clear()
+        assert list(iter_array_items(_chunks(data, size), "elements", trailer)) == [{"id": 1}]
+        assert trailer == {"remark": "runtime error: Query timed out"}
+    trailer = {}
+    assert list(iter_array_items([b'{"elements": []}'], "elements", trailer)) == []
+    assert trailer == {}
@@ -0,0 +1,66 @@
+from coffee_finder import local_index, providers
+
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="40.7130" lon="-74.0062">
+    <tag k="amenity" v="cafe"/>
+    <tag k="name" v="Corner Cafe"/>
+    <tag k="addr:street" v="Main St"/>
+  </node>
+  <node id="2" lat="40.7140" lon="-74.0070">
+    <tag k="amenity" v="restaurant"/>
+    <tag k="name" v="Not Coffee"/>
+  </node>
+  <node id="3" lat="40.7200" lon="-74.0000"/>
+  <node id="4" lat="40.7202" lon="-74.0004"/>
+  <node id="5" lat="40.7130" lon="-74.0061">
+    <tag k="amenity" v="cafe"/>
+  </node>
+  <way id="10">
+    <nd ref="3"/>
+    <nd ref="4"/>
+    <tag k="shop" v="coffee"/>
+    <tag k="name" v="Roastery"/>
+  </way>
+</osm>
+"""
+
+
+def test_build_and_search_local_index(tmp_path, monkeypatch):
+    src = tmp_path / "extract.osm"
+    src.write_text(OSM_XML)
+    index = str(tmp_path / "poi.db")
+    # unnamed cafes and non-coffee nodes are skipped
+    assert local_index.build_index(str(src), index) == 2
+    assert local_index.index_info(index)["places"] == "2"
+
+    monkeypatch.setattr(local_index, "index_path", lambda: index)
+    res = providers.search_local_index(40.7128, -74.0060, radius=300, limit=5)
+    assert [p["name"] for p in res] == ["Corner Cafe"]
+    assert res[0]["address"] == "Main St"
+    assert res[0]["source"] == "local"
+
+    # the "local" strategy answers from the index without any network provider
+    monkeypatch.setattr(providers, "search_overpass", lambda *a, **kw: 1 / 0)
+    res = providers.choose_provider(40.7200, -74.0002, radius=200, limit=5, strategy="local")
+    assert [p["name"] for p in res] == ["Roastery"]
+
+
+def test_local_index_is_opt_in(tmp_path, monkeypatch):
+    src = tmp_path / "extract.osm"
+    src.write_text(OSM_XML)
+    index = str(tmp_path / "poi.db")
+    local_index.build_index(str(src), index)
+    monkeypatch.setattr(local_index, "index_path", lambda: index)
+    monkeypatch.setattr(providers, "get_google_api_key", lambda: None)
+    online = [{"name": "Rated", "rating": 4.5, "source": "overpass"}]
+    monkeypatch.setattr(providers, "search_overpass", lambda *a, **kw: online)
+
+    # the default strategy ignores the index
+    assert providers.choose_provider(40.7200, -74.0002, radius=200, limit=5, strategy="fallback") == online
+    # local places have no rating, so rating filters go online
+    assert providers.choose_provider(40.7200, -74.0002, radius=200, limit=5, min_rating=4.0,
+                                     strategy="local") == online
+    pages = providers.iter_provider_pages(40.7200, -74.0002, radius=200, limit=5, min_rating=4.0,
+                                          strategy="local")
+    assert list(pages) == [online]
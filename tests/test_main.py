@@ -1,3 +1,4 @@
+from coffee_finder import batch
 from coffee_finder import main as cf_main
 
 
@@ -13,3 +14,37 @@ def test_main_cli_with_latlng(monkeypatch, capsys):
     captured = capsys.readouterr()
     assert "Found 1 places" in captured.out or "Found 1 place" in captured.out
     assert "My Coffee" in captured.out
+
+
+def test_main_cli_stream(monkeypatch, capsys):
+    pages = [[{"name": "First", "distance_m": 10}], [{"name": "Second", "distance_m": 20}]]
+    monkeypatch.setattr(cf_main, "iter_provider_pages", lambda lat, lng, radius=1000, limit=10, min_rating=None: iter(pages))
+    cf_main.main(["--latlng", "1.0,2.0", "--stream"])
+    out = capsys.readouterr().out
+    assert "1. First" in out and "2. Second" in out
+    assert "Found 2 places" in out
+
+
+def test_main_cli_batch(monkeypatch, tmp_path, capsys):
+    import json
+
+    def fake_choose(lat, lng, radius=1000, limit=10, min_rating=None):
+        return [{"name": f"Cafe {lat}", "distance_m": 5}]
+
+    def fake_geocode(address):
+        if address == "nowhere":
+            raise RuntimeError("Address not found")
+        return 3.0, 4.0
+
+    monkeypatch.setattr(batch, "choose_provider", fake_choose)
+    monkeypatch.setattr(batch, "geocode", fake_geocode)
+    inputs = tmp_path / "in.txt"
+    inputs.write_text("1.0,2.0\n# comment\n\nmain street\nnowhere\n")
+    cf_main.main(["--batch", str(inputs), "--workers", "2"])
+    captured = capsys.readouterr()
+    records = [json.loads(line) for line in captured.out.splitlines()]
+    assert [r["line"] for r in records] == [1, 4, 5]
+    assert records[0]["places"][0]["name"] == "Cafe 1.0"
+    assert (records[1]["lat"], records[1]["lng"]) == (3.0, 4.0)
+    assert records[2]["error"] == "Address not found"
+    assert "3 inputs (1 failed)" in captured.err
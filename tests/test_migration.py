@@ -1,6 +1,6 @@
-"""Test database migration from old schema to new schema."""
+"""Test database migrations: the versioned runner and upgrades of old schemas."""
 import pytest
-from coffee_finder import database
+from coffee_finder import database, migrations
 import os
 import tempfile
 import sqlite3
@@ -85,6 +85,62 @@ def test_migrate_existing_database(monkeypatch):
         assert len(places) == 1
         assert places[0]['name'] == "Old Cafe"
         
+        # Step 6: Verify old places were added to the spatial index
+        places = database.get_saved_places_near("default_user", 41.0, -75.0, radius=100)
+        assert [p['name'] for p in places] == ["Old Cafe"]
+        
     finally:
         if os.path.exists(db_path):
             os.remove(db_path)
+
+
+def test_migrate_applies_pending_steps_once(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "m.db"))
+    calls = []
+    steps = (
+        "CREATE TABLE t (a INTEGER)",
+        lambda c: calls.append(c.execute("INSERT INTO t VALUES (1)")),
+    )
+    assert migrations.migrate(conn, steps) == 2
+    assert migrations.schema_version(conn) == 2
+    assert migrations.migrate(conn, steps) == 0
+    assert len(calls) == 1
+
+    steps += ("ALTER TABLE t ADD COLUMN b TEXT",)
+    assert migrations.migrate(conn, steps) == 1
+    assert migrations.has_column(conn, "t", "b")
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+
+def test_failed_migration_rolls_back(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "m.db"))
+
+    def broken(c):
+        c.execute("INSERT INTO t VALUES (2)")
+        raise ValueError("boom")
+
+    steps = ("CREATE TABLE t (a INTEGER)", broken)
+    with pytest.raises(ValueError):
+        migrations.migrate(conn, steps)
+    # the first step stuck, the broken one left nothing behind
+    assert migrations.schema_version(conn) == 1
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_newer_database_is_refused(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "m.db"))
+    conn.execute("PRAGMA user_version = 5")
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn, ("CREATE TABLE t (a INTEGER)",))
+
+
+def test_user_database_is_versioned(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "user.db")
+    monkeypatch.setattr(database, "_DB_PATH", db_path)
+    database._init_db()
+
+    conn = sqlite3.connect(db_path)
+    assert migrations.schema_version(conn) == len(database._MIGRATIONS)
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(saved_places)")}
+    assert "saved_places_username" in indexes
+    conn.close()
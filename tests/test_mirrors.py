@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from coffee_finder.mirrors import MirrorPool
+
+
+def test_hedges_to_second_mirror_when_primary_is_slow():
+    release = threading.Event()
+    calls = []
+
+    def fn(url):
+        calls.append(url)
+        if url == "a":
+            release.wait(5)
+        return url
+
+    pool = MirrorPool(["a", "b"], default_hedge_delay=0.05)
+    started = time.monotonic()
+    try:
+        assert pool.call(fn) == "b"
+    finally:
+        release.set()
+    assert time.monotonic() - started < 2
+    assert calls == ["a", "b"]
+    assert pool.stats["hedged"] == 1
+
+
+def test_failing_mirror_is_ejected():
+    def fn(url):
+        if url == "bad":
+            raise IOError("down")
+        return url
+
+    pool = MirrorPool(["bad", "good"], eject_after=2)
+    for _ in range(3):
+        assert pool.call(fn) == "good"
+    assert [m.url for m in pool.ranked()] == ["good", "bad"]
+    assert pool.stats["ejections"] == 1
+
+
+def test_raises_when_all_mirrors_fail():
+    def fn(url):
+        raise IOError(url)
+
+    with pytest.raises(IOError):
+        MirrorPool(["a", "b"]).call(fn)
+
+
+def test_calls_run_at_callers_priority():
+    from coffee_finder.scheduler import BACKGROUND, INTERACTIVE, current_priority, priority
+
+    seen = []
+
+    def fn(url):
+        seen.append(current_priority())
+        return url
+
+    pool = MirrorPool(["a"])
+    with priority(BACKGROUND):
+        pool.call(fn)
+    pool.call(fn)
+    assert seen == [BACKGROUND, INTERACTIVE]
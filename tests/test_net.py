@@ -0,0 +1,58 @@
+from coffee_finder import config, net, scheduler
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_is_shared_and_pools_per_host(monkeypatch):
+    settings = dict(config.get_http_settings(), host_pool_maxsize={"overpass-api.de": 4})
+    monkeypatch.setattr(net, "get_http_settings", lambda: settings)
+    net.reset_session()
+    try:
+        session = net.get_session()
+        assert net.get_session() is session
+        adapter = session.get_adapter("https://overpass-api.de/api/interpreter")
+        assert adapter._pool_maxsize == 4
+        assert session.get_adapter("https://ipinfo.io/json")._pool_maxsize == settings["pool_maxsize"]
+    finally:
+        net.reset_session()
+
+
+def test_request_uses_configured_timeouts(monkeypatch):
+    seen = {}
+
+    class FakeSession:
+        def request(self, method, url, timeout=None, **kwargs):
+            seen.update(method=method, url=url, timeout=timeout)
+            return FakeResponse(200)
+
+    monkeypatch.setattr(net, "get_session", lambda: FakeSession())
+    net.get("https://example.com/")
+    settings = config.get_http_settings()
+    assert seen["timeout"] == (settings["connect_timeout"], settings["read_timeout"])
+    net.post("https://example.com/", timeout=3)
+    assert seen["method"] == "POST" and seen["timeout"] == 3
+
+
+def test_request_retries_throttled_answers(monkeypatch):
+    answers = [FakeResponse(429, {"Retry-After": "0"}), FakeResponse(503), FakeResponse(200)]
+
+    class FakeSession:
+        def request(self, method, url, timeout=None, **kwargs):
+            return answers.pop(0)
+
+    sched = scheduler.Scheduler({}, backoff_base=0.01)
+    monkeypatch.setattr(net, "get_session", lambda: FakeSession())
+    monkeypatch.setattr(net, "get_scheduler", lambda: sched)
+    first, second = answers[0], answers[1]
+    assert net.get("https://overpass-api.de/api/interpreter").status_code == 200
+    assert first.closed and second.closed
+    stats = sched.snapshot()
+    assert stats["requests"] == 3 and stats["throttled"] == 2 and stats["retries"] == 2
@@ -0,0 +1,55 @@
+from coffee_finder import cache, database, net, prefetch, scheduler
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield b'{"elements": []}'
+
+    def close(self):
+        pass
+
+
+def test_warm_cache_refreshes_stale_points_at_background_priority(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "_DB_PATH", str(tmp_path / "user.db"))
+    monkeypatch.setattr(cache, "_DB_PATH", str(tmp_path / "cache.db"))
+    database._init_db()
+    database.set_home_location(40.0, -74.0, "alice")
+    database.save_place("Beans", 40.0001, -74.0001, "alice")  # same spot as home
+    database.save_place("Brew", 41.0, -73.0, "bob")
+    assert sorted(prefetch.prefetch_points()) == [(40.0, -74.0), (41.0, -73.0)]
+
+    # record the priority of the actual HTTP requests, which run on mirror
+    # pool threads
+    seen = []
+
+    class RecordingScheduler(scheduler.Scheduler):
+        def acquire(self, host, level=None):
+            seen.append(scheduler.current_priority() if level is None else level)
+            super().acquire(host, level)
+
+    class FakeSession:
+        def request(self, method, url, timeout=None, **kwargs):
+            return FakeResponse()
+
+    monkeypatch.setattr(net, "get_scheduler", lambda: RecordingScheduler({}))
+    monkeypatch.setattr(net, "get_session", lambda: FakeSession())
+    # tiles around bob's place are fresh, alice's are not
+    monkeypatch.setattr(prefetch, "cache_get", lambda key, max_age_seconds: None if "dr5" in key else [])
+    stats = prefetch.warm_cache()
+    assert stats == {"points": 2, "warmed": 1, "fresh": 1, "errors": 0}
+    assert seen == [scheduler.BACKGROUND]
+
+
+def test_run_periodically_starts_each_task_once():
+    import threading
+
+    ran = threading.Event()
+    assert scheduler.run_periodically("test-periodic", ran.set, 3600)
+    assert ran.wait(5)
+    assert not scheduler.run_periodically("test-periodic", ran.set, 3600)
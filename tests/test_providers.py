@@ -1,5 +1,6 @@
+import json
 import os
-from coffee_finder import providers
+from coffee_finder import cache, providers
 
 
 def test_choose_provider_uses_overpass_when_no_key(monkeypatch):
@@ -22,10 +23,307 @@ def test_choose_provider_prefers_google_if_key(monkeypatch):
 
     sample_google = [{"name": "G Cafe", "lat": 1.0, "lng": 2.0, "distance_m": 50, "source": "google"}]
 
-    def fake_google(key, lat, lng, radius=1000, limit=20):
-        return sample_google
+    def fake_google(key, lat, lng, radius=1000):
+        yield sample_google
 
     # monkeypatch the google search function used internally
-    monkeypatch.setattr(providers, "search_google_places", fake_google)
+    monkeypatch.setattr(providers, "iter_google_place_pages", fake_google)
     res = providers.choose_provider(1.0, 2.0, radius=500, limit=5)
     assert res == sample_google
+
+
+def test_search_overpass_reuses_cached_tiles(monkeypatch):
+    store = {}
+    monkeypatch.setattr(providers, "cache_get", lambda k, max_age_seconds=0, stale_seconds=0: store.get(k))
+    monkeypatch.setattr(providers, "cache_set", lambda k, v: store.__setitem__(k, v))
+    monkeypatch.setattr(providers, "cache_get_area", lambda *a, **kw: None)
+    monkeypatch.setattr(providers, "cache_set_area", lambda *a, **kw: None)
+
+    calls = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            body = json.dumps({"version": 0.6, "elements": [
+                {"type": "node", "lat": 40.7130, "lon": -74.0062, "tags": {"name": "Near Cafe"}},
+                {"type": "node", "lat": 40.7135, "lon": -74.0065, "tags": {}},
+            ]}).encode()
+            # deliver in small pieces to exercise the incremental parser
+            for i in range(0, len(body), 7):
+                yield body[i:i + 7]
+
+        def close(self):
+            pass
+
+    def fake_post(url, data=None, timeout=None, stream=False):
+        calls.append(data)
+        return FakeResponse()
+
+    monkeypatch.setattr(providers.net, "post", fake_post)
+
+    res = providers.search_overpass(40.7128, -74.0060, radius=500, limit=5)
+    assert [p["name"] for p in res] == ["Near Cafe"]
+    assert len(calls) == 1
+
+    # a query a few metres away is answered from the cached tiles
+    res = providers.search_overpass(40.71285, -74.00605, radius=500, limit=5)
+    assert [p["name"] for p in res] == ["Near Cafe"]
+    assert res[0]["distance_m"] < 100
+    assert len(calls) == 1
+
+
+def test_search_overpass_serves_smaller_radius_from_area(monkeypatch):
+    area = [{"name": "Close", "lat": 40.7130, "lng": -74.0062, "address": "", "distance_m": None,
+             "rating": None, "source": "overpass"},
+            {"name": "Far", "lat": 40.7228, "lng": -74.0060, "address": "", "distance_m": None,
+             "rating": None, "source": "overpass"}]
+    monkeypatch.setattr(providers, "cache_get_area", lambda *a, **kw: area)
+
+    def no_network(*a, **kw):
+        raise AssertionError("should not hit the network")
+
+    monkeypatch.setattr(providers.net, "post", no_network)
+    res = providers.search_overpass(40.7128, -74.0060, radius=500, limit=5)
+    assert [p["name"] for p in res] == ["Close"]
+
+
+def test_merge_results_dedupes_across_sources():
+    google = [{"name": "Blue Bottle Coffee", "lat": 40.0, "lng": -74.0, "address": None,
+               "distance_m": 20, "rating": 4.6, "source": "google"}]
+    osm = [{"name": "Blue Bottle", "lat": 40.0002, "lng": -74.0001, "address": "1 Main St",
+            "distance_m": 30, "rating": None, "source": "overpass"},
+           {"name": "Other Place", "lat": 40.001, "lng": -74.0, "address": "",
+            "distance_m": 110, "rating": None, "source": "overpass"}]
+    merged = providers.merge_results(google, osm, limit=10)
+    assert [p["name"] for p in merged] == ["Blue Bottle Coffee", "Other Place"]
+    assert merged[0]["rating"] == 4.6
+    assert merged[0]["address"] == "1 Main St"
+    assert merged[0]["source"] == "google+overpass"
+
+
+def test_merge_results_merges_each_source_once():
+    google = [{"name": "Blue Bottle", "lat": 40.0, "lng": -74.0, "address": None,
+               "distance_m": 20, "rating": 4.6, "source": "google"}]
+    # the same cafe mapped as both a node and a way
+    osm = [{"name": "Blue Bottle", "lat": 40.0001, "lng": -74.0, "address": None,
+            "distance_m": 25, "rating": None, "source": "overpass"},
+           {"name": "Blue Bottle", "lat": 40.0002, "lng": -74.0, "address": "1 Main St",
+            "distance_m": 30, "rating": None, "source": "overpass"}]
+    merged = providers.merge_results(google, osm, limit=10)
+    assert [p["source"] for p in merged] == ["google+overpass", "overpass"]
+
+
+def test_choose_provider_fanout_returns_by_deadline(monkeypatch):
+    import threading
+    import time
+
+    monkeypatch.setenv("GOOGLE_PLACES_API_KEY", "fake-key")
+    release = threading.Event()
+
+    def slow_google(key, lat, lng, radius=1000, limit=20):
+        release.wait(5)
+        return [{"name": "G Cafe", "lat": 1.0, "lng": 2.0, "distance_m": 50, "source": "google"}]
+
+    def fast_overpass(lat, lng, radius=1000, limit=20):
+        return [{"name": "O Cafe", "lat": 1.001, "lng": 2.0, "distance_m": 110, "source": "overpass"}]
+
+    monkeypatch.setattr(providers, "search_google_places", slow_google)
+    monkeypatch.setattr(providers, "search_overpass", fast_overpass)
+    monkeypatch.setattr(providers, "get_provider_settings",
+                        lambda: {"strategy": "fanout", "deadline_seconds": 0.2})
+    started = time.monotonic()
+    try:
+        res = providers.choose_provider(1.0, 2.0, radius=500, limit=5)
+    finally:
+        release.set()
+    assert [p["name"] for p in res] == ["O Cafe"]
+    assert time.monotonic() - started < 5
+
+
+def test_google_pages_are_fetched_lazily(monkeypatch):
+    requested = []
+
+    class FakeResponse:
+        def __init__(self, page):
+            self.page = page
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            results = [{"name": f"P{self.page}-{i}", "geometry": {"location": {"lat": 1.0, "lng": 2.0}}}
+                       for i in range(20)]
+            return {"results": results, "next_page_token": f"tok{self.page + 1}"}
+
+    def fake_get(url, params=None):
+        requested.append(params)
+        return FakeResponse(len(requested))
+
+    monkeypatch.setattr(providers.net, "get", fake_get)
+    it = providers.iter_google_places("key", 1.0, 2.0)
+    first = [next(it) for _ in range(20)]
+    assert first[0]["name"] == "P1-0"
+    assert len(requested) == 1
+    # limit within the first page never requests a second one
+    assert len(providers.search_google_places("key", 1.0, 2.0, limit=5)) == 5
+    assert len(requested) == 2
+
+
+def test_search_overpass_revalidates_stale_area(monkeypatch):
+    area = [{"name": "Close", "lat": 40.7130, "lng": -74.0062, "address": "", "distance_m": None,
+             "rating": None, "source": "overpass"}]
+
+    def stale_area(*a, **kw):
+        providers._count_stale()
+        return area
+
+    refreshed = []
+    monkeypatch.setattr(providers, "cache_get_area", stale_area)
+    monkeypatch.setattr(providers, "refresh_overpass_area", lambda *a: refreshed.append(a))
+    before = providers.stale_reads()
+    res = providers.search_overpass(40.7128, -74.0060, radius=500, limit=5)
+    assert [p["name"] for p in res] == ["Close"]
+    assert providers.stale_reads() == before + 1
+    assert cache.wait_for_refreshes(5)
+    assert refreshed == [(40.7128, -74.0060, 500)]
+
+
+def test_choose_provider_coalesces_identical_searches(monkeypatch):
+    import threading
+
+    release = threading.Event()
+    calls = []
+
+    def slow_overpass(lat, lng, radius=1000, limit=20):
+        calls.append(lat)
+        release.wait(5)
+        return [{"name": "Shared"}]
+
+    monkeypatch.delenv("GOOGLE_PLACES_API_KEY", raising=False)
+    monkeypatch.setattr(providers, "get_google_api_key", lambda: None)
+    monkeypatch.setattr(providers, "_search_local", lambda *a: [])
+    monkeypatch.setattr(providers, "search_overpass", slow_overpass)
+    results = []
+    shared = providers._search_flights.stats["shared"]
+    threads = [threading.Thread(target=lambda: results.append(providers.choose_provider(1.0, 2.0, radius=500)))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    while providers._search_flights.stats["shared"] < shared + 2 and len(calls) < 3:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [1.0]
+    assert results == [[{"name": "Shared"}]] * 3
+
+
+def test_google_pages_are_coalesced(monkeypatch):
+    import threading
+
+    release = threading.Event()
+    requested = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"results": [{"name": "Shared", "geometry": {"location": {"lat": 1.0, "lng": 2.0}}}]}
+
+    def slow_get(url, params=None):
+        requested.append(params)
+        release.wait(5)
+        return FakeResponse()
+
+    monkeypatch.setattr(providers.net, "get", slow_get)
+    results = []
+    shared = providers._google_flights.stats["shared"]
+    # e.g. the same GUI search started twice
+    threads = [threading.Thread(target=lambda: results.append(list(providers.iter_google_place_pages("k", 1.0, 2.0))))
+               for _ in range(2)]
+    for t in threads:
+        t.start()
+    while providers._google_flights.stats["shared"] < shared + 1 and len(requested) < 2:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(requested) == 1
+    assert results[0] == results[1] and results[0][0][0]["name"] == "Shared"
+
+
+def test_search_overpass_does_not_cache_incomplete_answers(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "_DB_PATH", str(tmp_path / "cache.db"))
+    bodies = [
+        # Overpass reports a timeout as 200 with a trailing remark
+        b'{"version": 0.6, "elements": [\n\n],\n"remark": "runtime error: Query timed out in \\"query\\""\n}',
+        json.dumps({"elements": [{"type": "node", "lat": 40.7130, "lon": -74.0062,
+                                  "tags": {"name": "Recovered"}}]}).encode(),
+    ]
+
+    class FakeResponse:
+        def __init__(self, body):
+            self.body = body
+
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            yield self.body
+
+        def close(self):
+            pass
+
+    def fake_post(url, data=None, timeout=None, stream=False):
+        return FakeResponse(bodies.pop(0))
+
+    monkeypatch.setattr(providers.net, "post", fake_post)
+    assert providers.search_overpass(40.7128, -74.0060, radius=500, limit=5) == []
+    # the failed answer was not cached: a nearby search asks again
+    res = providers.search_overpass(40.7135, -74.0060, radius=500, limit=5)
+    assert [p["name"] for p in res] == ["Recovered"]
+    assert bodies == []
+
+
+def test_streamed_search_matches_choose_provider_and_joins_it(monkeypatch):
+    import threading
+
+    pages = [[{"name": f"G{i}-{j}", "source": "google"} for j in range(3)] for i in range(3)]
+    monkeypatch.setattr(providers, "get_google_api_key", lambda: "k")
+    monkeypatch.setattr(providers, "iter_google_place_pages", lambda *a, **kw: iter(pages))
+    monkeypatch.setattr(providers, "search_overpass", lambda *a, **kw: 1 / 0)
+    streamed = list(providers.iter_provider_pages(1.0, 2.0, limit=7, strategy="fallback"))
+    assert [len(p) for p in streamed] == [3, 3, 1]
+    assert [p for page in streamed for p in page] == providers.choose_provider(1.0, 2.0, limit=7,
+                                                                                strategy="fallback")
+
+    # a streamed search waits for an identical search already in flight
+    release = threading.Event()
+    calls = []
+
+    def slow_pages(*a, **kw):
+        calls.append(1)
+        release.wait(5)
+        return iter(pages)
+
+    monkeypatch.setattr(providers, "iter_google_place_pages", slow_pages)
+    results = []
+    leader = threading.Thread(target=lambda: results.append(providers.choose_provider(3.0, 4.0, limit=7,
+                                                                                      strategy="fallback")))
+    leader.start()
+    while not calls:
+        pass
+    follower = threading.Thread(target=lambda: results.append(list(
+        providers.iter_provider_pages(3.0, 4.0, limit=7, strategy="fallback"))))
+    shared = providers._search_flights.stats["shared"]
+    follower.start()
+    while providers._search_flights.stats["shared"] == shared:
+        pass
+    release.set()
+    leader.join()
+    follower.join()
+    assert calls == [1]
+    assert [results[0]] in results
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from coffee_finder import scheduler
+
+
+def test_bucket_paces_requests_per_host():
+    sched = scheduler.Scheduler({"slow.example": 20.0})
+    started = time.monotonic()
+    for _ in range(4):
+        sched.acquire("slow.example")
+    # first token is free, the next three wait 1/20 s each
+    assert time.monotonic() - started >= 0.14
+    started = time.monotonic()
+    for _ in range(4):
+        sched.acquire("fast.example")
+    assert time.monotonic() - started < 0.05
+
+
+def test_interactive_requests_go_first():
+    bucket = scheduler.HostBucket(rate=20.0)
+    bucket.acquire()  # use up the burst
+    order = []
+
+    def worker(level, name):
+        bucket.acquire(level)
+        order.append(name)
+
+    background = threading.Thread(target=worker, args=(scheduler.BACKGROUND, "background"))
+    background.start()
+    time.sleep(0.01)
+    interactive = threading.Thread(target=worker, args=(scheduler.INTERACTIVE, "interactive"))
+    interactive.start()
+    background.join()
+    interactive.join()
+    assert order == ["interactive", "background"]
+
+
+def test_priority_context_is_per_thread():
+    assert scheduler.current_priority() == scheduler.INTERACTIVE
+    with scheduler.priority(scheduler.BACKGROUND):
+        assert scheduler.current_priority() == scheduler.BACKGROUND
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(scheduler.current_priority()))
+        t.start()
+        t.join()
+        assert seen == [scheduler.INTERACTIVE]
+    assert scheduler.current_priority() == scheduler.INTERACTIVE
+
+
+def test_throttling_blocks_host_and_parses_retry_after():
+    sched = scheduler.Scheduler({})
+    assert sched.throttled("busy.example", 0, "2") == 2.0
+    assert sched.bucket("busy.example").blocked_until > time.monotonic() + 1.5
+    assert scheduler.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert scheduler.parse_retry_after("soon") is None
+    for attempt in range(5):
+        assert 0 <= sched.backoff(attempt) <= min(sched.backoff_max, sched.backoff_base * 2 ** attempt)
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from coffee_finder.singleflight import Group
+
+
+def _run_concurrently(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def test_concurrent_calls_share_one_execution():
+    group = Group()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["shared"]
+
+    leader = _run_concurrently(1, lambda: results.append(group.do("k", fn)))
+    started.wait(5)
+    followers = _run_concurrently(3, lambda: results.append(group.do("k", fn)))
+    while group.stats["shared"] < 3:
+        pass
+    release.set()
+    for t in leader + followers:
+        t.join()
+    assert calls == [1]
+    assert len(results) == 4 and all(r is results[0] for r in results)
+    # once finished, the next call runs again
+    assert group.do("k", lambda: "fresh") == "fresh"
+
+
+def test_errors_are_shared_and_not_cached():
+    group = Group()
+    with pytest.raises(ValueError):
+        group.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert group.do("k", lambda: 1) == 1
+
+
+def test_join_waits_only_for_a_call_in_flight():
+    group = Group()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    assert group.join("k") == (False, None)
+    leader = _run_concurrently(1, lambda: group.do("k", fn))
+    started.wait(5)
+    joined = []
+    follower = _run_concurrently(1, lambda: joined.append(group.join("k")))
+    while group.stats["shared"] < 1:
+        pass
+    release.set()
+    for t in leader + follower:
+        t.join()
+    assert joined == [(True, "shared")]
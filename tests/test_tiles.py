@@ -0,0 +1,33 @@
+from coffee_finder import tiles
+
+
+def test_encode_known_value():
+    # reference value from the geohash spec examples
+    assert tiles.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_bbox_contains_point():
+    gh = tiles.encode(40.7128, -74.0060, 6)
+    s, w, n, e = tiles.bbox(gh)
+    assert s <= 40.7128 <= n
+    assert w <= -74.0060 <= e
+
+
+def test_covering_tiles_cover_disk():
+    cover = set(tiles.covering_tiles(40.7128, -74.0060, 1000, 6))
+    # points on the edge of the disk must fall in a covering tile
+    for dlat, dlng in ((0.0089, 0), (-0.0089, 0), (0, 0.0118), (0, -0.0118)):
+        assert tiles.encode(40.7128 + dlat, -74.0060 + dlng, 6) in cover
+    # nearby queries share the same tiles
+    assert set(tiles.covering_tiles(40.7129, -74.0061, 1000, 6)) & cover
+
+
+def test_disk_bounds_and_tiles_include_rim():
+    from coffee_finder.utils import haversine_distance
+
+    lat, lng = 40.0, -74.0
+    rim = (lat + 999.5 / 111194.93, lng)
+    assert haversine_distance(lat, lng, *rim) < 1000
+    s, w, n, e = tiles.disk_bounds(lat, lng, 1000)
+    assert s <= rim[0] <= n
+    assert tiles.encode(*rim, 6) in tiles.covering_tiles(lat, lng, 1000, 6)
@@ -0,0 +1,45 @@
+import io
+import json
+
+from coffee_finder import main as cf_main
+from coffee_finder import trace
+
+
+def test_span_is_noop_when_disabled():
+    trace.reset()
+    with trace.span("idle"):
+        pass
+    assert trace.span("idle") is trace.span("other")
+    assert trace.summary() == []
+
+
+def test_spans_nest_and_export_json_lines():
+    out = io.StringIO()
+    trace.reset()
+    trace.enable(trace.jsonl_exporter(out))
+    try:
+        with trace.span("search", provider="overpass"):
+            for _ in range(2):
+                with trace.span("cache.get"):
+                    pass
+    finally:
+        trace.disable()
+    rows = {r["path"]: r for r in trace.summary()}
+    trace.reset()
+    assert list(rows) == ["search", "search/cache.get"]
+    assert rows["search/cache.get"]["count"] == 2 and rows["search/cache.get"]["depth"] == 1
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["path"] for r in records] == ["search/cache.get", "search/cache.get", "search"]
+    assert records[-1]["attrs"] == {"provider": "overpass"}
+
+
+def test_main_profile_prints_breakdown(monkeypatch, capsys):
+    def fake_choose(lat, lng, radius=1000, limit=10, min_rating=None):
+        with trace.span("choose_provider"):
+            return [{"name": "My Coffee", "distance_m": 1}]
+
+    monkeypatch.setattr(cf_main, "choose_provider", fake_choose)
+    cf_main.main(["--latlng", "1.0,2.0", "--profile"])
+    err = capsys.readouterr().err
+    assert "main" in err and "  locate" in err and "  choose_provider" in err
+    assert not trace.enabled()
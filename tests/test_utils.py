@@ -17,3 +17,28 @@ def test_parse_latlng_bad():
     import pytest
     with pytest.raises(ValueError):
         parse_latlng("not-a-pair")
+
+
+def test_haversine_many_matches_scalar(monkeypatch):
+    from coffee_finder import utils
+    lats = [40.0, 40.5, -33.9]
+    lngs = [-74.0, -73.5, 151.2]
+    expected = [haversine_distance(40.7, -74.0, a, b) for a, b in zip(lats, lngs)]
+    monkeypatch.setattr(utils, "_NUMPY_MIN_ITEMS", 1)
+    for np in (utils.np, None):
+        monkeypatch.setattr(utils, "np", np)
+        got = utils.haversine_many(40.7, -74.0, lats, lngs)
+        assert all(math.isclose(g, e, rel_tol=1e-9) for g, e in zip(got, expected))
+
+
+def test_top_k_and_nearest(monkeypatch):
+    from coffee_finder import utils
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    monkeypatch.setattr(utils, "_NUMPY_MIN_ITEMS", 1)
+    for np in (utils.np, None):
+        monkeypatch.setattr(utils, "np", np)
+        assert utils.top_k_indices(values, 3) == [1, 3, 4]
+        assert utils.top_k_indices(values, 10) == [1, 3, 4, 2, 0]
+    places = [{"lat": 0.0, "lng": 0.001 * i} for i in (3, 1, 20, 2)]
+    ranked = utils.nearest(0.0, 0.0, places, radius=500, k=2)
+    assert [p for _, p in ranked] == [places[1], places[3]]